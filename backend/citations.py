@@ -2,7 +2,7 @@
 Citation extraction and management.
 Extracts citations from vector store search results.
 """
-from typing import List, Optional, Set, TYPE_CHECKING
+from typing import List, Optional, TYPE_CHECKING
 import config
 
 if TYPE_CHECKING:
@@ -45,30 +45,24 @@ class CitationExtractor:
         except Exception:
             return []
     
+    def extract_from_results(self, results: List) -> List[str]:
+        """Extract citations from search results that were already fetched."""
+        return self._extract_urls(results)
+    
     def _extract_urls(self, results: List) -> List[str]:
-        """Extract unique URLs from search results."""
-        seen_urls: Set[str] = set()
-        citations: List[str] = []
-        
-        for result in results:
-            # Handle tuple format: (text, similarity, metadata)
-            if isinstance(result, tuple) and len(result) >= 3:
-                _, _, metadata = result[:3]
-            elif isinstance(result, dict):
-                metadata = result
-            else:
-                continue
-            
-            # Ensure metadata is a dict
-            if not isinstance(metadata, dict):
-                continue
-                
-            url = metadata.get('url')
-            if url and url not in seen_urls:
-                citations.append(url)
-                seen_urls.add(url)
-        
-        return citations
+        """Extract unique URLs from search results, in result order."""
+        return list(dict.fromkeys(
+            url for url in map(self._result_url, results) if url
+        ))
+    
+    @staticmethod
+    def _result_url(result) -> Optional[str]:
+        """URL from a (text, similarity, metadata) tuple or a metadata dict."""
+        if isinstance(result, tuple) and len(result) >= 3:
+            metadata = result[2]
+        else:
+            metadata = result
+        return metadata.get('url') if isinstance(metadata, dict) else None
     
     def get_default_citations(self) -> List[str]:
         """Get default Nextflow documentation citations."""
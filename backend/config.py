@@ -29,14 +29,20 @@ if _CONFIG_PATH is None:
         f"config.yaml not found. Tried: {', '.join(str(p) for p in possible_paths)}"
     )
 
+# libyaml's C loader when PyYAML was built with it (same safe semantics)
+_YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
 with open(_CONFIG_PATH, 'r') as f:
-    _config = yaml.safe_load(f)
+    _config = yaml.load(f, Loader=_YamlLoader)
 
 # Helper function to get config value with env override
-def _get_config(section: dict, key: str, env_key: str = None, default=None, type_fn=None):
-    """Get config value with environment variable override."""
+def _get_config(section: dict, key: str, env_key: str = None, default=None, type_fn=None, env=None):
+    """Get config value with environment variable override.
+    
+    env defaults to os.environ; pass a mapping to resolve against other values.
+    """
     env_key = env_key or key.upper()
-    env_val = os.getenv(env_key)
+    env_val = (os.environ if env is None else env).get(env_key)
     if env_val is not None:
         return type_fn(env_val) if type_fn else env_val
     yaml_val = section.get(key, default)
@@ -73,6 +79,11 @@ LLM_MODEL = _get_config(_llm_config, 'model', 'LLM_MODEL', 'gemini-2.0-flash-exp
 LLM_TEMPERATURE = _get_config(_llm_config, 'temperature', 'LLM_TEMPERATURE', 0.7, float)
 LLM_MAX_TOKENS = _get_config(_llm_config, 'max_tokens', 'LLM_MAX_TOKENS', 1000, int)
 MAX_INPUT_LENGTH = _get_config(_llm_config, 'max_input_length', 'MAX_INPUT_LENGTH', 500000, int)
+WARMUP_ON_STARTUP = _get_config(_llm_config, 'warmup_on_startup', 'WARMUP_ON_STARTUP', True)
+LLM_REPLY_CACHE_SIZE = _get_config(_llm_config, 'reply_cache_size', 'LLM_REPLY_CACHE_SIZE', 1024, int)
+# Convert to bool if string
+if isinstance(WARMUP_ON_STARTUP, str):
+    WARMUP_ON_STARTUP = WARMUP_ON_STARTUP.lower() in ('true', '1', 'yes', 'on')
 
 # Vector Store Configuration
 _vector_config = _config.get('vector_store', {})
@@ -89,6 +100,30 @@ else:  # Local development
 
 VECTOR_SEARCH_TOP_K = _get_config(_vector_config, 'search_top_k', 'VECTOR_SEARCH_TOP_K', 5, int)
 VECTOR_SEARCH_THRESHOLD = _get_config(_vector_config, 'search_threshold', 'VECTOR_SEARCH_THRESHOLD', 0.4, float)
+VECTOR_MIN_QUERY_CHARS = _get_config(_vector_config, 'min_query_chars', 'VECTOR_MIN_QUERY_CHARS', 3, int)
+VECTOR_INDEX_FACTORY = _get_config(_vector_config, 'index_factory', 'VECTOR_INDEX_FACTORY', 'auto').strip()
+VECTOR_SEARCH_NPROBE = _get_config(_vector_config, 'search_nprobe', 'VECTOR_SEARCH_NPROBE', 16, int)
+VECTOR_SEARCH_EF = _get_config(_vector_config, 'search_ef', 'VECTOR_SEARCH_EF', 64, int)
+VECTOR_INDEX_MMAP = _get_config(_vector_config, 'mmap_index', 'VECTOR_INDEX_MMAP', True)
+# Convert to bool if string
+if isinstance(VECTOR_INDEX_MMAP, str):
+    VECTOR_INDEX_MMAP = VECTOR_INDEX_MMAP.lower() in ('true', '1', 'yes', 'on')
+VECTOR_BINARY_QUANTIZE = _get_config(_vector_config, 'binary_quantize', 'VECTOR_BINARY_QUANTIZE', False)
+# Convert to bool if string
+if isinstance(VECTOR_BINARY_QUANTIZE, str):
+    VECTOR_BINARY_QUANTIZE = VECTOR_BINARY_QUANTIZE.lower() in ('true', '1', 'yes', 'on')
+VECTOR_RERANK_FACTOR = _get_config(_vector_config, 'rerank_factor', 'VECTOR_RERANK_FACTOR', 4, int)
+VECTOR_QUERY_CACHE_SIZE = _get_config(_vector_config, 'query_cache_size', 'VECTOR_QUERY_CACHE_SIZE', 1024, int)
+VECTOR_BATCH_MAX_SIZE = _get_config(_vector_config, 'batch_max_size', 'VECTOR_BATCH_MAX_SIZE', 32, int)
+VECTOR_BATCH_WAIT_MS = _get_config(_vector_config, 'batch_wait_ms', 'VECTOR_BATCH_WAIT_MS', 8, float)
+FAISS_NUM_THREADS = _get_config(_vector_config, 'faiss_num_threads', 'FAISS_NUM_THREADS', 1, int)
+
+# Session Configuration
+_session_config = _config.get('session', {})
+SESSION_MAX_SESSIONS = _get_config(_session_config, 'max_sessions', 'SESSION_MAX_SESSIONS', 10000, int)
+SESSION_TTL_SECONDS = _get_config(_session_config, 'ttl_seconds', 'SESSION_TTL_SECONDS', 86400, int)
+SESSION_MAX_HISTORY = _get_config(_session_config, 'max_history_messages', 'SESSION_MAX_HISTORY', 20, int)
+SESSION_REDIS_URL = _get_config(_session_config, 'redis_url', 'REDIS_URL', '').strip()
 
 # System Prompt
 SYSTEM_PROMPT = _config.get('system_prompt', '').strip()
@@ -0,0 +1,149 @@
+"""
+Shared pytest fixtures for backend tests.
+"""
+import asyncio
+import hashlib
+import os
+import re
+
+# Use the locally cached embedding model without Hub revision checks.
+# Set before test modules import transformers/huggingface_hub, which read these
+# at import time; export HF_HUB_OFFLINE=0 to let a fresh machine download it.
+for _var, _value in {
+    "HF_HUB_OFFLINE": "1",
+    "TRANSFORMERS_OFFLINE": "1",
+    "HF_HUB_DISABLE_TELEMETRY": "1",
+    "TOKENIZERS_PARALLELISM": "false",
+}.items():
+    os.environ.setdefault(_var, _value)
+
+import numpy as np
+import pytest
+from unittest.mock import MagicMock, create_autospec, patch
+from google import genai
+
+# Captured before any fixture patches it
+_GENAI_CLIENT_CLASS = genai.Client
+
+
+@pytest.fixture(scope="module")
+def event_loop():
+    """One event loop per test module instead of one per async test."""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+class FakeEmbeddingGenerator:
+    """Deterministic stand-in for EmbeddingGenerator (no model load).
+    
+    Hashes each word into a bucket of a 384-dim vector and L2-normalizes, so
+    texts sharing words score higher than unrelated ones (cosine stays in [0, 1]).
+    """
+    dimension = 384
+
+    def _vector(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.blake2b(word.encode(), digest_size=8).digest()
+            vector[int.from_bytes(digest, "little") % self.dimension] += 1.0
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            vector[0] = norm = 1.0
+        return vector / norm
+
+    def embed(self, text: str) -> np.ndarray:
+        return self._vector(text)
+
+    def embed_batch(self, texts) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return np.stack([self._vector(text) for text in texts])
+
+
+@pytest.fixture(scope="session")
+def embedding_gen():
+    """Fast deterministic embeddings for store/index tests (see real_embedding_gen)."""
+    return FakeEmbeddingGenerator()
+
+
+@pytest.fixture(scope="session")
+def real_embedding_gen():
+    """The real sentence-transformers encoder, loaded once per run (integration tests)."""
+    from vector_store.embeddings import EmbeddingGenerator
+    return EmbeddingGenerator()
+
+
+@pytest.fixture(scope="module")
+def _genai_client_patch():
+    """Patch google-genai Client once per test module."""
+    with patch('llm_client.genai.Client') as mock:
+        yield mock
+
+
+@pytest.fixture(scope="module")
+def _genai_client_spec():
+    """Client instance mock specced from genai.Client, built once per module."""
+    return create_autospec(_GENAI_CLIENT_CLASS, instance=True)
+
+
+@pytest.fixture(scope="module")
+def _service_account_patch():
+    """Patch service account credential loading once per test module."""
+    with patch('llm_client.service_account.Credentials.from_service_account_file') as mock:
+        yield mock
+
+
+@pytest.fixture
+def mock_genai_client(_genai_client_patch, _genai_client_spec):
+    """Mock google-genai Client returning the shared spec instance, reset for each test."""
+    _genai_client_patch.reset_mock(side_effect=True)
+    _genai_client_spec.reset_mock(return_value=True, side_effect=True)
+    _genai_client_patch.return_value = _genai_client_spec
+    return _genai_client_patch
+
+
+@pytest.fixture
+def mock_service_account(_service_account_patch):
+    """Mock Credentials.from_service_account_file, reset for each test."""
+    _service_account_patch.reset_mock(return_value=True, side_effect=True)
+    return _service_account_patch
+
+
+@pytest.fixture(scope="module")
+def _module_llm_client(_genai_client_patch, _genai_client_spec, _service_account_patch):
+    """LLMClient built once per module on top of the shared mocks."""
+    from llm_client import LLMClient
+    _genai_client_patch.return_value = _genai_client_spec
+    _service_account_patch.reset_mock(return_value=True, side_effect=True)
+    return LLMClient(service_account_path="test.json")
+
+
+@pytest.fixture
+def llm_client(_module_llm_client, mock_genai_client, mock_service_account):
+    """Module-shared LLMClient; its mocked genai client is reset for each test."""
+    return _module_llm_client
+
+
+@pytest.fixture
+def genai_models_mock(mock_genai_client, mock_service_account):
+    """Sync `models` namespace of the mocked genai client instance."""
+    return mock_genai_client.return_value.models
+
+
+@pytest.fixture
+def make_genai_response():
+    """Builder for a generate_content response with the given text."""
+    def build(text):
+        response = MagicMock()
+        response.text = text
+        return response
+    return build
+
+
+@pytest.fixture
+def sample_messages():
+    """Sample messages for testing."""
+    return [
+        {"role": "user", "content": "What is Nextflow?"}
+    ]
@@ -5,26 +5,23 @@ from typing import List
 
 
 def format_context(results: List) -> str:
-    """Format search results into context string."""
+    """Format search results into context string.
+    
+    Results are (text, similarity, metadata) tuples as returned by
+    FAISSVectorStore.search; anything else is skipped.
+    """
     context_parts = []
     seen_urls = set()
     
     for result in results:
-        # Handle tuple format: (text, similarity, metadata)
-        if isinstance(result, tuple) and len(result) >= 3:
-            text, _, metadata = result[:3]
-        else:
+        if not isinstance(result, tuple) or len(result) < 3:
             continue
-        
-        # Ensure metadata is a dict
-        if not isinstance(metadata, dict):
-            metadata = {}
-        
+        text, _, metadata = result[:3]
         context_parts.append(text)
-        url = metadata.get('url')
+        
+        url = metadata.get('url') if isinstance(metadata, dict) else None
         if url and url not in seen_urls:
             context_parts.append(f"Source: {url}")
             seen_urls.add(url)
     
     return "\n\n".join(context_parts)
-
@@ -8,6 +8,9 @@ import json
 
 API_URL = "http://localhost:8000"
 
+# One keep-alive connection for every request in the run
+SESSION = requests.Session()
+
 def test_chat():
     """Test the chat endpoint with sample questions."""
     test_cases = [
@@ -27,7 +30,7 @@ def test_chat():
         }
         
         try:
-            response = requests.post(f"{API_URL}/chat", json=payload)
+            response = SESSION.post(f"{API_URL}/chat", json=payload)
             response.raise_for_status()
             data = response.json()
             
@@ -50,7 +53,7 @@ def test_chat():
     }
     
     try:
-        response = requests.post(f"{API_URL}/chat", json=payload)
+        response = SESSION.post(f"{API_URL}/chat", json=payload)
         response.raise_for_status()
         data = response.json()
         print(f"✓ Response: {data['reply'][:100]}...")
@@ -64,7 +67,7 @@ def test_chat():
 if __name__ == "__main__":
     # Check if server is running
     try:
-        response = requests.get(f"{API_URL}/health")
+        response = SESSION.get(f"{API_URL}/health")
         if response.status_code == 200:
             print("✓ Backend is running")
             test_chat()
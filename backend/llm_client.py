@@ -3,7 +3,7 @@ LLM client for calling Gemini via Vertex AI using google-genai SDK.
 """
 import os
 import logging
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 from google import genai
 import config
 from google.genai import types
@@ -54,23 +54,20 @@ class LLMClient:
             credentials=credentials
         )
     
-    def complete(
+    def _build_request(
         self,
         messages: List[Dict[str, str]],
         system_prompt: Optional[str] = None
-    ) -> str:
+    ) -> Tuple[List[types.Content], types.GenerateContentConfig]:
         """
-        Complete a conversation with the LLM.
+        Build google-genai contents and generation config for a conversation.
         
         Args:
             messages: List of message dicts with 'role' and 'content'
             system_prompt: Optional system prompt (passed as systemInstruction)
         
         Returns:
-            Response content string
-        
-        Raises:
-            ValueError: If response is empty
+            (contents, gen_config) tuple
         """
         contents = []
         
@@ -102,7 +99,27 @@ class LLMClient:
             )
             gen_config_params["system_instruction"] = system_instruction
         
-        gen_config = types.GenerateContentConfig(**gen_config_params)
+        return contents, types.GenerateContentConfig(**gen_config_params)
+    
+    def complete(
+        self,
+        messages: List[Dict[str, str]],
+        system_prompt: Optional[str] = None
+    ) -> str:
+        """
+        Complete a conversation with the LLM.
+        
+        Args:
+            messages: List of message dicts with 'role' and 'content'
+            system_prompt: Optional system prompt (passed as systemInstruction)
+        
+        Returns:
+            Response content string
+        
+        Raises:
+            ValueError: If response is empty
+        """
+        contents, gen_config = self._build_request(messages, system_prompt)
         
         logger.info(f"Sending to LLM (model={self.model}):")
         resp = self.client.models.generate_content(
@@ -115,3 +132,62 @@ class LLMClient:
             raise ValueError("Empty response from LLM")
         
         return resp.text
+    
+    async def acomplete(
+        self,
+        messages: List[Dict[str, str]],
+        system_prompt: Optional[str] = None
+    ) -> str:
+        """
+        Complete a conversation with the LLM using the native async client.
+        
+        Args:
+            messages: List of message dicts with 'role' and 'content'
+            system_prompt: Optional system prompt (passed as systemInstruction)
+        
+        Returns:
+            Response content string
+        
+        Raises:
+            ValueError: If response is empty
+        """
+        contents, gen_config = self._build_request(messages, system_prompt)
+        
+        logger.info(f"Sending to LLM (model={self.model}):")
+        resp = await self.client.aio.models.generate_content(
+            model=self.model,
+            contents=contents,
+            config=gen_config
+        )
+        
+        if not resp.text:
+            raise ValueError("Empty response from LLM")
+        
+        return resp.text
+    
+    async def stream(
+        self,
+        messages: List[Dict[str, str]],
+        system_prompt: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream a conversation completion from the LLM as text chunks.
+        
+        Args:
+            messages: List of message dicts with 'role' and 'content'
+            system_prompt: Optional system prompt (passed as systemInstruction)
+        
+        Yields:
+            Response text chunks as they are generated
+        """
+        contents, gen_config = self._build_request(messages, system_prompt)
+        
+        logger.info(f"Streaming from LLM (model={self.model}):")
+        chunks = await self.client.aio.models.generate_content_stream(
+            model=self.model,
+            contents=contents,
+            config=gen_config
+        )
+        async for chunk in chunks:
+            if chunk.text:
+                yield chunk.text
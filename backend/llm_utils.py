@@ -1,12 +1,14 @@
 """
 LLM utility functions for building messages and system prompts.
 """
+from functools import lru_cache
 from typing import List, Dict
 import config
 
 
+@lru_cache(maxsize=1)
 def get_system_prompt() -> str:
-    """Get Nextflow-specific system prompt."""
+    """Get Nextflow-specific system prompt (built once; config is fixed at import)."""
     base_prompt = config.SYSTEM_PROMPT
     
     # Add max_output_tokens information to prompt
@@ -17,10 +19,11 @@ def get_system_prompt() -> str:
 
 def build_messages(conversation_history: List[Dict], query: str, context: str = "") -> List[Dict]:
     """Build message list for LLM."""
-    messages = []
-    if conversation_history:
-        for msg in conversation_history:
-            messages.append({"role": msg["role"], "content": msg["content"]})
+    # History is capped per session (config.SESSION_MAX_HISTORY), so this copy stays small
+    messages = [
+        {"role": msg["role"], "content": msg["content"]}
+        for msg in conversation_history or ()
+    ]
     
     user_message = query
     if context:
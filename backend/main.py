@@ -3,14 +3,23 @@ FastAPI application for Nextflow Chat Assistant.
 """
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from contextlib import asynccontextmanager
-from typing import Optional
-import os
+from typing import AsyncIterator, List, Optional, Tuple
 import asyncio
+import hashlib
+import os
 import logging
+import re
+import orjson
+from cachetools import LRUCache
 
 # Set tokenizers parallelism to avoid fork warnings
 os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+# Single-threaded BLAS/OpenMP by default (must be set before faiss/numpy load):
+# small per-request searches oversubscribe the CPU when each spawns ncpu threads
+for _var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+    os.environ.setdefault(_var, "1")
 os.environ.setdefault("FAISS_OPT_LEVEL", "")
 
 # Setup logging first
@@ -26,32 +35,102 @@ from session_manager import (
 from security import check_prompt_injection
 from llm_utils import get_system_prompt, build_messages
 from context_formatter import format_context
-from vector_store_manager import initialize_vector_store, load_or_build_index, VECTOR_STORE_AVAILABLE
+from vector_store_manager import (
+    initialize_vector_store, load_or_build_index, SearchBatcher, VECTOR_STORE_AVAILABLE
+)
 from citations import CitationExtractor
 from llm_client import LLMClient
 import config
 
 # Global state
 vector_store_instance = None
+search_batcher = None  # Coalesces concurrent searches; started in lifespan
 citation_extractor: Optional[CitationExtractor] = None
+llm_client: Optional[LLMClient] = None
+
+# Retrieval cache of (context, citations) keyed by normalized query (see query_cache_key)
+retrieval_cache: Optional[LRUCache] = (
+    LRUCache(maxsize=config.VECTOR_QUERY_CACHE_SIZE) if config.VECTOR_QUERY_CACHE_SIZE > 0 else None
+)
+
+# Reply cache for single-turn questions, keyed by normalized query + context
+reply_cache: Optional[LRUCache] = (
+    LRUCache(maxsize=config.LLM_REPLY_CACHE_SIZE) if config.LLM_REPLY_CACHE_SIZE > 0 else None
+)
+
+
+def query_cache_key(query: str, query_lower: Optional[str] = None) -> bytes:
+    """Hash a query after case/whitespace normalization.
+    
+    The embedding model is uncased and tokenization ignores extra whitespace,
+    so queries differing only in those map to the same embedding.
+    """
+    if query_lower is None:
+        query_lower = query.lower()
+    normalized = " ".join(query_lower.split())
+    return hashlib.blake2b(normalized.encode(), digest_size=16).digest()
 
 
-def get_knowledge_context(query: str) -> str:
-    """Retrieve relevant knowledge using vector store."""
+def reply_cache_key(query: str, context: str) -> bytes:
+    """Key a single-turn reply by normalized query and a hash of its context."""
+    context_hash = hashlib.blake2b(context.encode(), digest_size=8).digest()
+    return query_cache_key(query) + context_hash
+
+
+def clear_query_caches():
+    """Drop cached retrieval results and replies (e.g. after the index changes)."""
+    if retrieval_cache is not None:
+        retrieval_cache.clear()
+    if reply_cache is not None:
+        reply_cache.clear()
+
+
+def get_llm_client() -> LLMClient:
+    """Return the shared LLM client, creating it on first use."""
+    global llm_client
+    if llm_client is None:
+        llm_client = LLMClient()
+    return llm_client
+
+
+async def get_knowledge_context(query: str, query_lower: Optional[str] = None) -> Tuple[str, List[str]]:
+    """Retrieve relevant knowledge and its citation URLs using vector store.
+    
+    One search serves both the LLM context and the citations. Pass query_lower
+    if the caller already lowercased the query.
+    """
     global vector_store_instance
     
     if not vector_store_instance:
-        return ""
+        return "", []
+    
+    # Greetings like "hi" never clear the similarity threshold; skip the embedding pass
+    if len(query.strip()) < config.VECTOR_MIN_QUERY_CHARS:
+        return "", []
+    
+    key = query_cache_key(query, query_lower) if retrieval_cache is not None else None
+    if key is not None and key in retrieval_cache:
+        context, citations = retrieval_cache[key]
+        return context, list(citations)
     
     try:
         import time
         start_time = time.time()
         
-        results = vector_store_instance.search(
-            query, 
-            top_k=config.VECTOR_SEARCH_TOP_K,
-            threshold=config.VECTOR_SEARCH_THRESHOLD
-        )
+        if search_batcher is not None:
+            results = await search_batcher.submit(
+                query,
+                top_k=config.VECTOR_SEARCH_TOP_K,
+                threshold=config.VECTOR_SEARCH_THRESHOLD
+            )
+        else:
+            # Embedding + FAISS release the GIL; keep the event loop free
+            results = await asyncio.to_thread(
+                vector_store_instance.search,
+                query,
+                top_k=config.VECTOR_SEARCH_TOP_K,
+                threshold=config.VECTOR_SEARCH_THRESHOLD
+            )
         
         search_time = time.time() - start_time
         
@@ -71,10 +150,14 @@ def get_knowledge_context(query: str) -> str:
         elif results:
             logger.info(f"Vector search: {len(results)} results found ({search_time:.3f}s)")
         
-        return format_context(results) if results else ""
+        context = format_context(results) if results else ""
+        citations = citation_extractor.extract_from_results(results) if citation_extractor else []
+        if key is not None:
+            retrieval_cache[key] = (context, citations)
+        return context, list(citations)
     except Exception as e:
         logger.error(f"Error in vector store search: {e}", exc_info=True)
-        return ""
+        return "", []
 
 
 async def call_gemini_direct(
@@ -86,27 +169,51 @@ async def call_gemini_direct(
     messages = build_messages(conversation_history or [], query, context)
     system_prompt = get_system_prompt()
     
-    client = LLMClient()
-    # google-genai client is synchronous, run in executor to avoid blocking
+    client = get_llm_client()
+    # Native async call - no executor thread held per in-flight request
     try:
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            None, 
-            lambda: client.complete(messages, system_prompt)
-        )
+        return await client.acomplete(messages, system_prompt)
     except Exception as e:
         logger.error(f"Error calling Gemini: {e}")
         raise
 
 
+async def stream_gemini_direct(
+    query: str,
+    conversation_history: list = None,
+    context: str = ""
+) -> AsyncIterator[str]:
+    """Stream Gemini reply chunks via LLM client."""
+    messages = build_messages(conversation_history or [], query, context)
+    system_prompt = get_system_prompt()
+    
+    client = get_llm_client()
+    async for chunk in client.stream(messages, system_prompt):
+        yield chunk
+
+
 async def get_llm_response(
     query: str, 
     conversation_history: list, 
     context: str
 ) -> str:
-    """Get response from LLM with context."""
+    """Get response from LLM with context.
+    
+    Replies to first-turn questions (no history) are cached, so repeated
+    questions with the same retrieved context skip the LLM call.
+    """
+    key = None
+    if reply_cache is not None and not conversation_history:
+        key = reply_cache_key(query, context)
+        reply = reply_cache.get(key)
+        if reply is not None:
+            return reply
+    
     try:
-        return await call_gemini_direct(query, conversation_history, context)
+        reply = await call_gemini_direct(query, conversation_history, context)
+        if key is not None:
+            reply_cache[key] = reply
+        return reply
     except Exception as e:
         # Try fallback without context
         try:
@@ -119,11 +226,21 @@ async def get_llm_response(
             )
 
 
+async def warmup_llm(timeout: float = 10.0):
+    """Send one tiny request so credentials, client setup and TLS are done before traffic."""
+    try:
+        await asyncio.wait_for(call_gemini_direct("ping", [], ""), timeout=timeout)
+        logger.info("LLM client warmed up")
+    except Exception as e:
+        logger.warning(f"LLM warmup failed (continuing): {e}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Initialize vector store on startup (if available)."""
-    global vector_store_instance, citation_extractor
+    global vector_store_instance, citation_extractor, search_batcher
     
+    clear_query_caches()
     if VECTOR_STORE_AVAILABLE:
         logger.info("Initializing vector store...")
         try:
@@ -148,15 +265,42 @@ async def lifespan(app: FastAPI):
         vector_store_instance = None
         citation_extractor = CitationExtractor()
     
+    if vector_store_instance:
+        search_batcher = SearchBatcher(
+            vector_store_instance,
+            max_batch_size=config.VECTOR_BATCH_MAX_SIZE,
+            max_wait=config.VECTOR_BATCH_WAIT_MS / 1000,
+            max_threads=config.FAISS_NUM_THREADS
+        )
+        await search_batcher.start()
+    
+    if config.WARMUP_ON_STARTUP:
+        await warmup_llm()
+    
     yield
     logger.info("Shutting down...")
+    if search_batcher:
+        await search_batcher.stop()
+        search_batcher = None
 
 
-app = FastAPI(title="Nextflow Chat Assistant", lifespan=lifespan)
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson (faster than stdlib json)."""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
+
+app = FastAPI(
+    title="Nextflow Chat Assistant",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 # CORS middleware - configured from config.yaml
+# Origins are frozen for O(1) membership checks on every request
 cors_kwargs = {
-    "allow_origins": config.CORS_ALLOWED_ORIGINS,
+    "allow_origins": frozenset(config.CORS_ALLOWED_ORIGINS),
     "allow_credentials": config.CORS_ALLOW_CREDENTIALS,
     "allow_methods": config.CORS_ALLOWED_METHODS,
     "allow_headers": config.CORS_ALLOWED_HEADERS,
@@ -164,7 +308,8 @@ cors_kwargs = {
 
 # Add Vercel domain regex if enabled (from config.yaml)
 if config.CORS_ALLOW_VERCEL_DOMAINS:
-    cors_kwargs["allow_origin_regex"] = config.CORS_VERCEL_DOMAIN_REGEX
+    # Pre-compiled once at import (the middleware accepts a compiled pattern)
+    cors_kwargs["allow_origin_regex"] = re.compile(config.CORS_VERCEL_DOMAIN_REGEX)
 
 app.add_middleware(
     CORSMiddleware,
@@ -172,56 +317,69 @@ app.add_middleware(
 )
 
 
-def get_citations(query: str) -> Optional[list]:
-    """Get citations for query from vector store, with fallback to empty."""
-    global citation_extractor
-    if not citation_extractor:
-        return None
-    return citation_extractor.extract_from_query(query)
+def validate_chat_message(message: ChatMessage, message_lower: Optional[str] = None):
+    """Validate an incoming chat message, raising HTTPException if invalid."""
+    # Validate message
+    if not message.message or not message.message.strip():
+        raise HTTPException(
+            status_code=400,
+            detail="Message cannot be empty"
+        )
+    
+    # Light guardrail: check for prompt injection attempts
+    if check_prompt_injection(message.message, message_lower):
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Prompt injection pattern detected, but allowing through (LLM system prompt should handle)")
 
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat(message: ChatMessage):
-    """Main chat endpoint."""
+async def start_chat_turn(message: ChatMessage) -> Tuple[str, list, str, List[str]]:
+    """Validate a message and record it; shared by /chat and /chat/stream.
+    
+    Returns:
+        (session_id, conversation_history, context, citations) where history
+        excludes the message just added.
+    """
+    # Lowercased once; shared by the injection scan and the cache key
+    message_lower = message.message.lower()
+    validate_chat_message(message, message_lower)
+    
+    # Start retrieval first so the search overlaps the session bookkeeping
+    context_task = asyncio.create_task(get_knowledge_context(message.message, message_lower))
     try:
-        # Validate message
-        if not message.message or not message.message.strip():
-            raise HTTPException(
-                status_code=400,
-                detail="Message cannot be empty"
-            )
-        
-        # Validate input length
-        input_length = len(message.message)
-        if input_length > config.MAX_INPUT_LENGTH:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Input message is too large ({input_length:,} characters). Maximum allowed is {config.MAX_INPUT_LENGTH:,} characters."
-            )
-        
-        # Light guardrail: check for prompt injection attempts
-        if check_prompt_injection(message.message):
-            if logger.isEnabledFor(logging.DEBUG):
-                logger.debug("Prompt injection pattern detected, but allowing through (LLM system prompt should handle)")
-        
-        session_id = get_or_create_session(message.session_id)
+        session_id = await get_or_create_session(message.session_id)
         
         # Get conversation history (excluding the message we're about to add)
-        conversation_history = get_conversation_history(session_id)
+        conversation_history = await get_conversation_history(session_id)
         
         # Add user message to session
-        add_user_message(session_id, message.message)
+        await add_user_message(session_id, message.message)
+    except BaseException:
+        context_task.cancel()
+        raise
+    
+    context, citations = await context_task
+    return session_id, conversation_history, context, citations
+
+
+def format_sse_event(data: dict) -> str:
+    """Format a dict as a Server-Sent Events data frame."""
+    return f"data: {orjson.dumps(data).decode()}\n\n"
+
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat(message: ChatMessage):
+    """Main chat endpoint."""
+    try:
+        session_id, conversation_history, context, citations = await start_chat_turn(message)
         
-        # Get context and generate reply
-        context = get_knowledge_context(message.message)
+        # Generate reply
         reply = await get_llm_response(
             message.message, 
             conversation_history, 
             context
         )
         
-        add_assistant_message(session_id, reply)
-        citations = get_citations(message.message)
+        await add_assistant_message(session_id, reply)
         
         return ChatResponse(
             reply=reply,
@@ -238,6 +396,33 @@ async def chat(message: ChatMessage):
         )
 
 
+@app.post("/chat/stream")
+async def chat_stream(message: ChatMessage):
+    """Streaming chat endpoint (Server-Sent Events).
+    
+    Emits `{"delta": ...}` events as reply text is generated, then a final
+    `{"done": true, "session_id": ..., "citations": [...]}` event.
+    """
+    session_id, conversation_history, context, citations = await start_chat_turn(message)
+    
+    async def event_stream() -> AsyncIterator[str]:
+        reply_parts = []
+        try:
+            async for delta in stream_gemini_direct(message.message, conversation_history, context):
+                reply_parts.append(delta)
+                yield format_sse_event({"delta": delta})
+            yield format_sse_event({"done": True, "session_id": session_id, "citations": citations})
+        except Exception as e:
+            logger.error(f"Error streaming chat: {e}", exc_info=True)
+            yield format_sse_event({"error": f"LLM service unavailable: {str(e)}", "session_id": session_id})
+        finally:
+            # Store whatever was generated, even if the client disconnected mid-stream
+            if reply_parts:
+                await add_assistant_message(session_id, "".join(reply_parts))
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
 @app.get("/health")
 async def health():
     """Health check endpoint."""
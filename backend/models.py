@@ -1,13 +1,15 @@
 """
 Pydantic models for API requests and responses.
 """
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
+import config
 
 
 class ChatMessage(BaseModel):
     """Chat message request model."""
-    message: str
+    # Oversized input is rejected (422) during parsing, before any session or embedding work
+    message: str = Field(max_length=config.MAX_INPUT_LENGTH)
     session_id: Optional[str] = None
 
 
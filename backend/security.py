@@ -1,43 +1,90 @@
 """
 Security utilities for prompt injection detection.
 """
+from typing import Optional, Tuple
 import logging
+import re
+
+# Optional: pyahocorasick matches every pattern in one pass over the message
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 logger = logging.getLogger(__name__)
 
+# Common prompt injection patterns
+SUSPICIOUS_PATTERNS = (
+    "ignore previous instructions",
+    "forget your role",
+    "you are now",
+    "act as",
+    "pretend to be",
+    "new instructions:",
+    "override",
+    "new system prompt",
+    "previous prompt",
+    "original prompt",
+)
+
+# Role-playing indicators; more than MAX_ROLE_INDICATORS is suspicious
+ROLE_INDICATORS = ("you are", "you're")
+MAX_ROLE_INDICATORS = 2
+
+
+def _build_automaton():
+    """Build one Aho-Corasick automaton over all patterns, tagged by kind."""
+    automaton = ahocorasick.Automaton()
+    for pattern in SUSPICIOUS_PATTERNS:
+        automaton.add_word(pattern, (True, pattern))
+    for pattern in ROLE_INDICATORS:
+        automaton.add_word(pattern, (False, pattern))
+    automaton.make_automaton()
+    return automaton
+
+
+_AUTOMATON = _build_automaton() if ahocorasick is not None else None
+
+# Fallback without pyahocorasick: one compiled case-insensitive alternation each
+_SUSPICIOUS_RE = re.compile("|".join(map(re.escape, SUSPICIOUS_PATTERNS)), re.IGNORECASE)
+_ROLE_RE = re.compile("|".join(map(re.escape, ROLE_INDICATORS)), re.IGNORECASE)
+
+
+def _scan(message: str, message_lower: Optional[str] = None) -> Tuple[Optional[str], int]:
+    """Return (first suspicious pattern found or None, role indicator count)."""
+    if _AUTOMATON is not None:
+        role_indicators = 0
+        if message_lower is None:
+            message_lower = message.lower()
+        for _, (suspicious, pattern) in _AUTOMATON.iter(message_lower):
+            if suspicious:
+                return pattern, role_indicators
+            role_indicators += 1
+        return None, role_indicators
+
+    match = _SUSPICIOUS_RE.search(message)
+    if match:
+        return match.group(0).lower(), 0
+    return None, len(_ROLE_RE.findall(message))
+
 
-def check_prompt_injection(message: str) -> bool:
+def check_prompt_injection(message: str, message_lower: Optional[str] = None) -> bool:
     """
     Light guardrail to detect potential prompt injection attempts.
     Returns True if suspicious patterns are detected.
-    """
-    message_lower = message.lower()
-    
-    # Common prompt injection patterns
-    suspicious_patterns = [
-        "ignore previous instructions",
-        "forget your role",
-        "you are now",
-        "act as",
-        "pretend to be",
-        "new instructions:",
-        "override",
-        "new system prompt",
-        "previous prompt",
-        "original prompt",
-    ]
     
+    Pass message_lower if the caller already lowercased the message.
+    """
+    pattern, role_indicators = _scan(message, message_lower)
+
     # Check for suspicious patterns
-    for pattern in suspicious_patterns:
-        if pattern in message_lower:
-            logger.warning(f"Potential prompt injection detected: pattern '{pattern}' in message")
-            return True
-    
+    if pattern is not None:
+        logger.warning(f"Potential prompt injection detected: pattern '{pattern}' in message")
+        return True
+
     # Check for excessive role-playing attempts (multiple role indicators)
-    role_indicators = message_lower.count("you are") + message_lower.count("you're")
-    if role_indicators > 2:
+    if role_indicators > MAX_ROLE_INDICATORS:
         logger.warning(f"Potential prompt injection: excessive role indicators ({role_indicators})")
         return True
-    
-    return False
 
+    return False
@@ -1,54 +1,138 @@
 """
 Session management for chat conversations.
+
+Sessions live in process memory by default. When REDIS_URL is set they are
+stored in Redis instead, so every uvicorn worker/replica sees the same history;
+while Redis is unreachable, calls fall back to the in-memory store.
 """
-from typing import Dict, List
-from datetime import datetime
+from collections import deque
+from typing import Deque, Dict, List
+import time
 import uuid
 import logging
 
+import orjson
+from cachetools import TTLCache
+
+import config
+
 logger = logging.getLogger(__name__)
 
-# In-memory session storage
-sessions: Dict[str, List[Dict]] = {}
+def new_session_store() -> Dict[str, Deque[Dict]]:
+    """Create an empty in-memory session store, bounded by count and idle time (LRU + TTL)."""
+    return TTLCache(maxsize=config.SESSION_MAX_SESSIONS, ttl=config.SESSION_TTL_SECONDS)
+
+
+# In-memory session storage; each session is a deque capped at SESSION_MAX_HISTORY messages
+# Message timestamps are epoch nanoseconds (time.time_ns()); they only order
+# messages within a session, so no datetime/ISO formatting on the hot path
+sessions: Dict[str, Deque[Dict]] = new_session_store()
+
+# Optional shared Redis store (one list per session, orjson-encoded entries).
+# redis.asyncio keeps the network round-trips off the event loop.
+redis_client = None
+# Redis errors that make a call fall back to the in-memory store
+REDIS_UNAVAILABLE_ERRORS = ()
+if config.SESSION_REDIS_URL:
+    try:
+        import redis
+        import redis.asyncio
+        redis_client = redis.asyncio.Redis.from_url(config.SESSION_REDIS_URL)
+        REDIS_UNAVAILABLE_ERRORS = (redis.ConnectionError, redis.TimeoutError)
+        logger.info("Using Redis session store")
+    except ImportError:
+        logger.warning("REDIS_URL set but redis package not installed - using in-memory sessions")
 
 
-def get_or_create_session(session_id: str = None) -> str:
+def _redis_key(session_id: str) -> str:
+    return f"session:{session_id}"
+
+
+def _redis_unavailable(e: Exception):
+    logger.warning(f"Redis session store unavailable ({e}); using in-memory sessions")
+
+
+async def get_or_create_session(session_id: str = None) -> str:
     """Get existing session or create new one."""
     if not session_id:
         session_id = str(uuid.uuid4())
-    
-    # Ensure session exists in dict
-    if session_id not in sessions:
-        sessions[session_id] = []
-    
+
+    if redis_client is not None:
+        try:
+            # Redis lists are created on first push; just refresh the TTL
+            await redis_client.expire(_redis_key(session_id), config.SESSION_TTL_SECONDS)
+            return session_id
+        except REDIS_UNAVAILABLE_ERRORS as e:
+            _redis_unavailable(e)
+
+    # Ensure session exists; re-inserting refreshes its TTL
+    history = sessions.get(session_id)
+    sessions[session_id] = history if history is not None else _new_history()
+
     return session_id
 
 
-def add_user_message(session_id: str, message: str):
+def _new_history() -> Deque[Dict]:
+    return deque(maxlen=config.SESSION_MAX_HISTORY)
+
+
+async def _append_message(session_id: str, role: str, content: str):
+    """Append a message and drop the oldest ones past the history cap."""
+    message = {
+        "role": role,
+        "content": content,
+        "timestamp": time.time_ns()
+    }
+
+    if redis_client is not None:
+        key = _redis_key(session_id)
+        try:
+            async with redis_client.pipeline() as pipe:
+                pipe.rpush(key, orjson.dumps(message))
+                pipe.ltrim(key, -config.SESSION_MAX_HISTORY, -1)
+                pipe.expire(key, config.SESSION_TTL_SECONDS)
+                await pipe.execute()
+            return
+        except REDIS_UNAVAILABLE_ERRORS as e:
+            _redis_unavailable(e)
+
+    # deque(maxlen) drops the oldest message itself
+    history = sessions.get(session_id)
+    if history is None:
+        history = sessions[session_id] = _new_history()
+    history.append(message)
+
+
+async def add_user_message(session_id: str, message: str):
     """Add user message to session."""
-    sessions[session_id].append({
-        "role": "user",
-        "content": message,
-        "timestamp": datetime.now().isoformat()
-    })
+    await _append_message(session_id, "user", message)
 
 
-def add_assistant_message(session_id: str, reply: str):
+async def add_assistant_message(session_id: str, reply: str):
     """Add assistant message to session."""
-    sessions[session_id].append({
-        "role": "assistant",
-        "content": reply,
-        "timestamp": datetime.now().isoformat()
-    })
+    await _append_message(session_id, "assistant", reply)
 
 
-def get_conversation_history(session_id: str) -> List[Dict]:
-    """Get conversation history for a session."""
-    return sessions.get(session_id, []).copy()
+async def get_conversation_history(session_id: str) -> List[Dict]:
+    """Get conversation history for a session.
+    
+    Returns a snapshot list (at most SESSION_MAX_HISTORY messages) so callers
+    can append the current turn without it showing up in the history.
+    """
+    if redis_client is not None:
+        try:
+            return [orjson.loads(raw) for raw in await redis_client.lrange(_redis_key(session_id), 0, -1)]
+        except REDIS_UNAVAILABLE_ERRORS as e:
+            _redis_unavailable(e)
+    return list(sessions.get(session_id, ()))
 
 
-def clear_session(session_id: str):
+async def clear_session(session_id: str):
     """Clear a session (for testing)."""
+    if redis_client is not None:
+        try:
+            await redis_client.delete(_redis_key(session_id))
+        except REDIS_UNAVAILABLE_ERRORS as e:
+            _redis_unavailable(e)
     if session_id in sessions:
         del sessions[session_id]
-
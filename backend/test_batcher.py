@@ -0,0 +1,68 @@
+"""Unit tests for the vector search micro-batcher."""
+import asyncio
+import pytest
+from unittest.mock import MagicMock, patch
+from vector_store.batcher import SearchBatcher
+
+
+def make_store():
+    """Mock store whose search_batch echoes each query back as a result."""
+    store = MagicMock()
+    store.search_batch.side_effect = lambda queries, top_k, threshold: [
+        [(query, 1.0, {})] for query in queries
+    ]
+    return store
+
+
+@pytest.mark.asyncio
+async def test_concurrent_queries_share_one_batch():
+    """Test that queries submitted together are searched in one call."""
+    store = make_store()
+    batcher = SearchBatcher(store, max_batch_size=8, max_wait=0.05)
+    await batcher.start()
+    try:
+        results = await asyncio.gather(*[
+            batcher.submit(f"query {i}", top_k=3, threshold=0.4) for i in range(5)
+        ])
+    finally:
+        await batcher.stop()
+
+    assert [r[0][0] for r in results] == [f"query {i}" for i in range(5)]
+    store.search_batch.assert_called_once()
+    assert store.search_batch.call_args[0][1:] == (3, 0.4)
+
+
+@pytest.mark.asyncio
+async def test_batch_size_limit():
+    """Test that batches are split at max_batch_size."""
+    store = make_store()
+    batcher = SearchBatcher(store, max_batch_size=2, max_wait=0.05)
+    await batcher.start()
+    try:
+        await asyncio.gather(*[batcher.submit(f"query {i}") for i in range(5)])
+    finally:
+        await batcher.stop()
+
+    assert store.search_batch.call_count == 3
+
+
+def test_batch_threads_capped_by_max_threads():
+    """Test that a batch uses at most max_threads FAISS threads, then resets to one."""
+    batcher = SearchBatcher(make_store(), max_threads=2)
+    with patch('vector_store.batcher.faiss.omp_set_num_threads') as omp:
+        batcher._search_batch([f"query {i}" for i in range(5)], 3, 0.0)
+    assert [c.args[0] for c in omp.call_args_list] == [2, 1]
+
+
+@pytest.mark.asyncio
+async def test_search_error_propagates():
+    """Test that a failed batch raises in every waiting caller."""
+    store = MagicMock()
+    store.search_batch.side_effect = RuntimeError("index unavailable")
+    batcher = SearchBatcher(store, max_wait=0.01)
+    await batcher.start()
+    try:
+        with pytest.raises(RuntimeError, match="index unavailable"):
+            await batcher.submit("query")
+    finally:
+        await batcher.stop()
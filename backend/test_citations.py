@@ -82,3 +82,14 @@ def test_extract_urls_deduplication():
     assert len(urls) == 3
     assert urls.count("https://example.com/doc1") == 1
 
+
+
+def test_extract_from_results():
+    """Test extracting citations from precomputed search results."""
+    extractor = CitationExtractor()
+    results = [
+        ("text1", 0.9, {"url": "https://example.com/1"}),
+        ("text2", 0.8, {"url": "https://example.com/1"}),
+        ("text3", 0.7, {"url": "https://example.com/2"}),
+    ]
+    assert extractor.extract_from_results(results) == ["https://example.com/1", "https://example.com/2"]
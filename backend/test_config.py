@@ -7,6 +7,9 @@ import yaml
 from pathlib import Path
 import config
 
+# Repo-root config.yaml, resolved once for the module
+CONFIG_YAML_PATH = Path(__file__).parent.parent / "config.yaml"
+
 def test_llm_model():
     """Test LLM model is defined."""
     assert config.LLM_MODEL is not None
@@ -56,13 +59,23 @@ def test_system_prompt():
     assert "assistant" in config.SYSTEM_PROMPT.lower()
 
 
+def test_env_var_override():
+    """Test that environment variables override config.yaml values."""
+    # Resolve through the same helper as import time against an explicit
+    # environment; no module reload or os.environ mutation needed
+    def temperature(env):
+        return config._get_config(config._llm_config, 'temperature', 'LLM_TEMPERATURE', 0.7, float, env=env)
+    
+    assert temperature({"LLM_TEMPERATURE": "0.9"}) == 0.9
+    assert temperature({}) == config._llm_config.get('temperature', 0.7)
+
+
 def test_config_yaml_exists():
     """Test that config.yaml exists and is valid."""
-    config_path = Path(__file__).parent.parent / "config.yaml"
-    assert config_path.exists(), "config.yaml should exist"
+    assert CONFIG_YAML_PATH.exists(), "config.yaml should exist"
     
-    with open(config_path, 'r') as f:
-        yaml_config = yaml.safe_load(f)
+    with open(CONFIG_YAML_PATH, 'r') as f:
+        yaml_config = yaml.load(f, Loader=config._YamlLoader)
     
     assert 'api' in yaml_config
     assert 'llm' in yaml_config
@@ -3,55 +3,36 @@ import pytest
 from context_formatter import format_context
 
 
-def test_format_context_empty():
-    """Test formatting empty results."""
-    assert format_context([]) == ""
-
-
-def test_format_context_single_result():
-    """Test formatting a single result."""
-    results = [
-        ("This is some text", 0.9, {"url": "https://example.com"})
-    ]
-    formatted = format_context(results)
-    assert "This is some text" in formatted
-    assert "Source: https://example.com" in formatted
-
-
-def test_format_context_multiple_results():
-    """Test formatting multiple results."""
-    results = [
+@pytest.mark.parametrize("results", [
+    [],
+    [("This is some text", 0.9, {"url": "https://example.com"})],
+    [
         ("Text 1", 0.9, {"url": "https://example.com/1"}),
         ("Text 2", 0.8, {"url": "https://example.com/2"}),
-    ]
-    formatted = format_context(results)
-    assert "Text 1" in formatted
-    assert "Text 2" in formatted
-    assert "https://example.com/1" in formatted
-    assert "https://example.com/2" in formatted
-
-
-def test_format_context_duplicate_urls():
-    """Test that duplicate URLs are only shown once."""
-    results = [
+    ],
+    [
         ("Text 1", 0.9, {"url": "https://example.com"}),
         ("Text 2", 0.8, {"url": "https://example.com"}),
-    ]
-    formatted = format_context(results)
-    # Should only appear once
-    assert formatted.count("Source: https://example.com") == 1
-
-
-def test_format_context_no_metadata():
-    """Test formatting results without metadata."""
-    results = [
+    ],
+    [
         ("Text 1", 0.9, {}),
         ("Text 2", 0.8, None),
-    ]
+    ],
+], ids=["empty", "single", "multiple", "duplicate_urls", "no_metadata"])
+def test_format_context_properties(results):
+    """Test that every text appears and each URL gets exactly one Source line."""
     formatted = format_context(results)
-    assert "Text 1" in formatted
-    assert "Text 2" in formatted
-    assert "Source:" not in formatted
+
+    for text, _, _ in results:
+        assert text in formatted
+
+    urls = {metadata["url"] for _, _, metadata in results if metadata and metadata.get("url")}
+    for url in urls:
+        assert formatted.count(f"Source: {url}") == 1
+    assert formatted.count("Source:") == len(urls)
+
+    if not results:
+        assert formatted == ""
 
 
 def test_format_context_invalid_format():
@@ -64,4 +45,3 @@ def test_format_context_invalid_format():
     # Should only include valid results
     assert "valid" in formatted
     assert "invalid" not in formatted
-
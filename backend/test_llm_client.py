@@ -1,145 +1,108 @@
 """
 Tests for LLM client using google-genai SDK.
 """
+import re
 import pytest
-from unittest.mock import Mock, patch, MagicMock
+from unittest.mock import AsyncMock, MagicMock
 from llm_client import LLMClient
 import config
 
+# Expected error messages, compiled once for pytest.raises(match=...)
+_EMPTY_RE = re.compile(r"Empty response from LLM")
+_CREDENTIALS_RE = re.compile(r"GOOGLE_APPLICATION_CREDENTIALS")
+_PROJECT_RE = re.compile(r"GOOGLE_CLOUD_PROJECT not set")
 
-@pytest.fixture
-def mock_genai_client():
-    """Mock google-genai Client."""
-    with patch('llm_client.genai.Client') as mock:
-        yield mock
 
-
-@pytest.fixture
-def sample_messages():
-    """Sample messages for testing."""
-    return [
-        {"role": "user", "content": "What is Nextflow?"}
-    ]
+def test_llm_client_initialization(mock_genai_client, mock_service_account):
+    """Test LLM client initialization with defaults."""
+    # Mock credentials
+    mock_cred_obj = MagicMock()
+    mock_service_account.return_value = mock_cred_obj
+    
+    client = LLMClient()
+    assert client.model == config.LLM_MODEL
+    assert client.max_tokens == config.LLM_MAX_TOKENS
+    # Check that credentials were passed
+    call_kwargs = mock_genai_client.call_args[1]
+    assert call_kwargs["vertexai"] is True
+    assert call_kwargs["location"] == "us-central1"
+    assert call_kwargs["credentials"] == mock_cred_obj
 
 
-def test_llm_client_initialization():
-    """Test LLM client initialization with defaults."""
-    with patch('llm_client.genai.Client') as mock_client, \
-         patch('llm_client.service_account.Credentials.from_service_account_file') as mock_creds, \
-         patch('os.path.exists', return_value=True):
-        # Mock credentials
-        mock_cred_obj = MagicMock()
-        mock_creds.return_value = mock_cred_obj
-        
-        client = LLMClient()
-        assert client.model == config.LLM_MODEL
-        assert client.max_tokens == config.LLM_MAX_TOKENS
-        # Check that credentials were passed
-        call_kwargs = mock_client.call_args[1]
-        assert call_kwargs["vertexai"] is True
-        assert call_kwargs["location"] == "us-central1"
-        assert call_kwargs["credentials"] == mock_cred_obj
-
-
-def test_llm_client_custom_params():
+def test_llm_client_custom_params(mock_genai_client, mock_service_account):
     """Test LLM client with custom parameters."""
-    with patch('llm_client.genai.Client') as mock_client, \
-         patch('llm_client.service_account.Credentials.from_service_account_file') as mock_creds, \
-         patch('os.path.exists', return_value=True):
-        # Mock credentials
-        mock_cred_obj = MagicMock()
-        mock_creds.return_value = mock_cred_obj
-        
-        client = LLMClient(
-            model="test-model",
-            location="us-west1",
-            max_tokens=100,
-            service_account_path="test-credentials.json"
-        )
-        assert client.model == "test-model"
-        assert client.location == "us-west1"
-        assert client.max_tokens == 100
-        # Check that credentials were passed
-        call_kwargs = mock_client.call_args[1]
-        assert call_kwargs["vertexai"] is True
-        assert call_kwargs["location"] == "us-west1"
-        assert call_kwargs["credentials"] == mock_cred_obj
-
-
-def test_llm_client_no_service_account_path():
+    # Mock credentials
+    mock_cred_obj = MagicMock()
+    mock_service_account.return_value = mock_cred_obj
+    
+    client = LLMClient(
+        model="test-model",
+        location="us-west1",
+        max_tokens=100,
+        service_account_path="test-credentials.json"
+    )
+    assert client.model == "test-model"
+    assert client.location == "us-west1"
+    assert client.max_tokens == 100
+    # Check that credentials were passed
+    call_kwargs = mock_genai_client.call_args[1]
+    assert call_kwargs["vertexai"] is True
+    assert call_kwargs["location"] == "us-west1"
+    assert call_kwargs["credentials"] == mock_cred_obj
+
+
+def test_llm_client_no_service_account_path(monkeypatch):
     """Test error when service account path is not set.
     
     Note: In practice, config.py sets GOOGLE_APPLICATION_CREDENTIALS at import time,
-    so this test patches the environment variable access in llm_client to simulate
-    the case where it's not set.
+    so this test removes it from the environment (monkeypatch restores it).
     """
-    import llm_client
-    
-    # Patch os.environ in llm_client module to raise KeyError when accessing
-    # GOOGLE_APPLICATION_CREDENTIALS
-    original_environ = llm_client.os.environ
-    
-    class MockEnviron:
-        def __getitem__(self, key):
-            if key == "GOOGLE_APPLICATION_CREDENTIALS":
-                raise KeyError("GOOGLE_APPLICATION_CREDENTIALS")
-            return original_environ[key]
-        
-        def get(self, key, default=None):
-            if key == "GOOGLE_APPLICATION_CREDENTIALS":
-                raise KeyError("GOOGLE_APPLICATION_CREDENTIALS")
-            return original_environ.get(key, default)
-    
-    with patch.object(llm_client.os, 'environ', MockEnviron()):
-        with pytest.raises(KeyError, match="GOOGLE_APPLICATION_CREDENTIALS"):
-            LLMClient()
-
-def test_llm_client_complete_success(mock_genai_client, sample_messages):
-    """Test successful LLM completion."""
-    # Mock response
-    mock_response = MagicMock()
-    mock_response.text = "Nextflow is a workflow system."
-    
-    mock_models = MagicMock()
-    mock_models.generate_content.return_value = mock_response
-    
-    mock_client_instance = MagicMock()
-    mock_client_instance.models = mock_models
-    mock_genai_client.return_value = mock_client_instance
-    
-    with patch('os.path.exists', return_value=True), \
-         patch('llm_client.service_account.Credentials.from_service_account_file'):
-        client = LLMClient(service_account_path="test.json")
-        result = client.complete(sample_messages)
-    
-    assert result == "Nextflow is a workflow system."
-    mock_models.generate_content.assert_called_once()
-    call_kwargs = mock_models.generate_content.call_args[1]
+    monkeypatch.delenv("GOOGLE_APPLICATION_CREDENTIALS", raising=False)
+    with pytest.raises(KeyError, match=_CREDENTIALS_RE):
+        LLMClient()
+
+
+def test_llm_client_no_project_id(mock_genai_client, mock_service_account):
+    """Test error when the service account has no project id."""
+    mock_service_account.return_value.project_id = None
+    with pytest.raises(ValueError, match=_PROJECT_RE):
+        LLMClient()
+    mock_genai_client.assert_not_called()
+
+
+@pytest.mark.parametrize("response_text,raises", [
+    ("Nextflow is a workflow system.", None),
+    ("Response", None),
+    (None, ValueError),
+    ("", ValueError),
+])
+def test_llm_client_complete(response_text, raises, llm_client, genai_models_mock, make_genai_response, sample_messages):
+    """Test completion returns the response text and rejects empty responses."""
+    genai_models_mock.generate_content.return_value = make_genai_response(response_text)
+    
+    if raises:
+        with pytest.raises(raises, match=_EMPTY_RE):
+            llm_client.complete(sample_messages)
+        return
+    
+    result = llm_client.complete(sample_messages)
+    assert result == response_text
+    genai_models_mock.generate_content.assert_called_once()
+    call_kwargs = genai_models_mock.generate_content.call_args[1]
     assert call_kwargs["model"] == config.LLM_MODEL
     # Check config object has max_output_tokens
     assert call_kwargs["config"].max_output_tokens == config.LLM_MAX_TOKENS
 
 
-def test_llm_client_with_system_prompt(mock_genai_client, sample_messages):
+def test_llm_client_with_system_prompt(llm_client, genai_models_mock, make_genai_response, sample_messages):
     """Test LLM client with system prompt."""
-    mock_response = MagicMock()
-    mock_response.text = "Response"
-    
-    mock_models = MagicMock()
-    mock_models.generate_content.return_value = mock_response
-    
-    mock_client_instance = MagicMock()
-    mock_client_instance.models = mock_models
-    mock_genai_client.return_value = mock_client_instance
+    genai_models_mock.generate_content.return_value = make_genai_response("Response")
     
-    with patch('os.path.exists', return_value=True), \
-         patch('llm_client.service_account.Credentials.from_service_account_file'):
-        client = LLMClient(service_account_path="test.json")
-        result = client.complete(sample_messages, system_prompt="You are a helpful assistant.")
+    result = llm_client.complete(sample_messages, system_prompt="You are a helpful assistant.")
     
     assert result == "Response"
     # Check that system prompt was passed in config.system_instruction
-    call_args = mock_models.generate_content.call_args
+    call_args = genai_models_mock.generate_content.call_args
     call_kwargs = call_args[1]
     # System instruction should be in config
     config = call_kwargs["config"]
@@ -153,73 +116,59 @@ def test_llm_client_with_system_prompt(mock_genai_client, sample_messages):
     assert contents[0].parts[0].text == sample_messages[0]["content"]
 
 
-def test_llm_client_empty_response(mock_genai_client, sample_messages):
-    """Test handling of empty LLM response."""
-    mock_response = MagicMock()
-    mock_response.text = None
+def test_llm_client_multi_turn_conversation(llm_client, genai_models_mock, make_genai_response):
+    """Test multi-turn conversation handling."""
+    genai_models_mock.generate_content.return_value = make_genai_response("Follow-up response")
     
-    mock_models = MagicMock()
-    mock_models.generate_content.return_value = mock_response
+    messages = [
+        {"role": "user", "content": "What is Nextflow?"},
+        {"role": "assistant", "content": "Nextflow is a workflow system."},
+        {"role": "user", "content": "Tell me more."}
+    ]
     
-    mock_client_instance = MagicMock()
-    mock_client_instance.models = mock_models
-    mock_genai_client.return_value = mock_client_instance
+    result = llm_client.complete(messages)
+    assert result == "Follow-up response"
     
-    with patch('os.path.exists', return_value=True), \
-         patch('llm_client.service_account.Credentials.from_service_account_file'):
-        client = LLMClient(service_account_path="test.json")
-        with pytest.raises(ValueError, match="Empty response from LLM"):
-            client.complete(sample_messages)
+    # Verify all messages were passed
+    call_args = genai_models_mock.generate_content.call_args
+    contents = call_args[1]["contents"]
+    assert len(contents) == 3
+    assert contents[0].role == "user"
+    assert contents[1].role == "assistant"
+    assert contents[2].role == "user"
 
 
-def test_llm_client_context_manager(mock_genai_client, sample_messages):
-    """Test LLM client can be instantiated (context manager removed)."""
-    mock_response = MagicMock()
-    mock_response.text = "Response"
+
+@pytest.mark.asyncio
+async def test_llm_client_stream(llm_client, mock_genai_client, sample_messages):
+    """Test streaming completion yields text chunks and skips empty ones."""
+    async def fake_stream():
+        for text in ["Nextflow ", None, "is a workflow system."]:
+            chunk = MagicMock()
+            chunk.text = text
+            yield chunk
     
-    mock_models = MagicMock()
-    mock_models.generate_content.return_value = mock_response
+    mock_client_instance = mock_genai_client.return_value
+    mock_client_instance.aio.models.generate_content_stream = AsyncMock(return_value=fake_stream())
     
-    mock_client_instance = MagicMock()
-    mock_client_instance.models = mock_models
-    mock_genai_client.return_value = mock_client_instance
+    chunks = [chunk async for chunk in llm_client.stream(sample_messages, system_prompt="Be brief.")]
     
-    with patch('os.path.exists', return_value=True), \
-         patch('llm_client.service_account.Credentials.from_service_account_file'):
-        client = LLMClient(service_account_path="test.json")
-        result = client.complete(sample_messages)
-        assert result == "Response"
+    assert chunks == ["Nextflow ", "is a workflow system."]
+    call_kwargs = mock_client_instance.aio.models.generate_content_stream.call_args[1]
+    assert call_kwargs["model"] == config.LLM_MODEL
+    assert call_kwargs["config"].system_instruction.parts[0].text == "Be brief."
 
 
-def test_llm_client_multi_turn_conversation(mock_genai_client):
-    """Test multi-turn conversation handling."""
-    mock_response = MagicMock()
-    mock_response.text = "Follow-up response"
+@pytest.mark.asyncio
+async def test_llm_client_acomplete(llm_client, mock_genai_client, make_genai_response, sample_messages):
+    """Test native async completion via the aio client."""
+    mock_client_instance = mock_genai_client.return_value
+    mock_client_instance.aio.models.generate_content = AsyncMock(
+        return_value=make_genai_response("Nextflow is a workflow system.")
+    )
     
-    mock_models = MagicMock()
-    mock_models.generate_content.return_value = mock_response
+    result = await llm_client.acomplete(sample_messages)
     
-    mock_client_instance = MagicMock()
-    mock_client_instance.models = mock_models
-    mock_genai_client.return_value = mock_client_instance
-    
-    with patch('os.path.exists', return_value=True), \
-         patch('llm_client.service_account.Credentials.from_service_account_file'):
-        client = LLMClient(service_account_path="test.json")
-        messages = [
-            {"role": "user", "content": "What is Nextflow?"},
-            {"role": "assistant", "content": "Nextflow is a workflow system."},
-            {"role": "user", "content": "Tell me more."}
-        ]
-        
-        result = client.complete(messages)
-        assert result == "Follow-up response"
-        
-        # Verify all messages were passed
-        call_args = mock_models.generate_content.call_args
-        contents = call_args[1]["contents"]
-        assert len(contents) == 3
-        assert contents[0].role == "user"
-        assert contents[1].role == "assistant"
-        assert contents[2].role == "user"
-
+    assert result == "Nextflow is a workflow system."
+    mock_client_instance.aio.models.generate_content.assert_awaited_once()
+    mock_client_instance.models.generate_content.assert_not_called()
@@ -51,3 +51,8 @@ def test_build_messages_with_history_and_context():
     assert len(messages) == 2
     assert messages[1]["content"] == "Context from documentation:\nContext here\n\nUser question: What is Nextflow?"
 
+
+
+def test_get_system_prompt_cached():
+    """Test that the system prompt is built once and reused."""
+    assert get_system_prompt() is get_system_prompt()
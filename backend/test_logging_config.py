@@ -2,68 +2,29 @@
 import logging
 import os
 import sys
-from io import StringIO
-from logging_config import InfoFilter, setup_logging
-
 
-def test_info_filter_debug():
-    """Test that DEBUG logs pass through InfoFilter."""
-    filter_obj = InfoFilter()
-    record = logging.LogRecord(
-        name="test",
-        level=logging.DEBUG,
-        pathname="",
-        lineno=0,
-        msg="Debug message",
-        args=(),
-        exc_info=None
-    )
-    assert filter_obj.filter(record) is True
+import pytest
+from logging_config import InfoFilter, setup_logging
 
 
-def test_info_filter_info():
-    """Test that INFO logs pass through InfoFilter."""
-    filter_obj = InfoFilter()
-    record = logging.LogRecord(
-        name="test",
-        level=logging.INFO,
-        pathname="",
-        lineno=0,
-        msg="Info message",
-        args=(),
-        exc_info=None
-    )
-    assert filter_obj.filter(record) is True
+def _record(level: int) -> logging.LogRecord:
+    """Minimal LogRecord at the given level (makeLogRecord skips the full constructor)."""
+    return logging.makeLogRecord({"name": "test", "levelno": level, "levelname": logging.getLevelName(level), "msg": "x"})
 
 
-def test_info_filter_warning():
-    """Test that WARNING logs are blocked by InfoFilter (go to stderr instead)."""
-    filter_obj = InfoFilter()
-    record = logging.LogRecord(
-        name="test",
-        level=logging.WARNING,
-        pathname="",
-        lineno=0,
-        msg="Warning message",
-        args=(),
-        exc_info=None
-    )
-    assert filter_obj.filter(record) is False
+INFO_FILTER_CASES = [
+    pytest.param(logging.DEBUG, True, id="debug"),
+    pytest.param(logging.INFO, True, id="info"),
+    # WARNING and above are blocked here; they go to stderr instead
+    pytest.param(logging.WARNING, False, id="warning"),
+    pytest.param(logging.ERROR, False, id="error"),
+]
 
 
-def test_info_filter_error():
-    """Test that ERROR logs are blocked by InfoFilter (go to stderr instead)."""
-    filter_obj = InfoFilter()
-    record = logging.LogRecord(
-        name="test",
-        level=logging.ERROR,
-        pathname="",
-        lineno=0,
-        msg="Error message",
-        args=(),
-        exc_info=None
-    )
-    assert filter_obj.filter(record) is False
+@pytest.mark.parametrize("level,expected", INFO_FILTER_CASES)
+def test_info_filter(level, expected):
+    """Test that InfoFilter passes only DEBUG and INFO records to stdout."""
+    assert InfoFilter().filter(_record(level)) is expected
 
 
 def test_setup_logging():
@@ -145,41 +106,37 @@ def test_third_party_logger_suppression():
         transformers_logger.propagate = original_propagate
 
 
-def test_logging_output_streams():
-    """Test that INFO logs go to stdout and WARNING logs go to stderr."""
-    # Save original state
+def test_logging_output_streams(caplog):
+    """Test that INFO records are routed to stdout and WARNING records to stderr.
+    
+    Each captured record is offered to the handlers setup_logging installed
+    (level check plus filters, as Handler.handle does before emitting).
+    """
     root_logger = logging.getLogger()
     original_handlers = root_logger.handlers[:]
     original_level = root_logger.level
     
     try:
         setup_logging()
-        
-        # Capture stdout and stderr
-        stdout_capture = StringIO()
-        stderr_capture = StringIO()
-        
-        # Replace handlers with captured streams
-        root_logger.handlers.clear()
-        stdout_handler = logging.StreamHandler(stdout_capture)
-        stdout_handler.setLevel(logging.DEBUG)
-        stdout_handler.addFilter(InfoFilter())
-        root_logger.addHandler(stdout_handler)
-        
-        stderr_handler = logging.StreamHandler(stderr_capture)
-        stderr_handler.setLevel(logging.WARNING)
-        root_logger.addHandler(stderr_handler)
-        
-        # Test INFO log goes to stdout
-        root_logger.info("Test info message")
-        assert "Test info message" in stdout_capture.getvalue()
-        assert "Test info message" not in stderr_capture.getvalue()
-        
-        # Test WARNING log goes to stderr
-        root_logger.warning("Test warning message")
-        assert "Test warning message" in stderr_capture.getvalue()
-        assert "Test warning message" not in stdout_capture.getvalue()
+        streams = {handler.stream: handler for handler in root_logger.handlers}
+        # setup_logging replaces root handlers; re-attach caplog's capture handler
+        root_logger.addHandler(caplog.handler)
+        with caplog.at_level(logging.DEBUG):
+            root_logger.info("Test info message")
+            root_logger.warning("Test warning message")
     finally:
         # Restore original state
         root_logger.handlers = original_handlers
         root_logger.setLevel(original_level)
+    
+    def accepts(handler, record):
+        return record.levelno >= handler.level and bool(handler.filter(record))
+    
+    routed = {
+        record.getMessage(): (accepts(streams[sys.stdout], record), accepts(streams[sys.stderr], record))
+        for record in caplog.records
+    }
+    assert routed == {
+        "Test info message": (True, False),
+        "Test warning message": (False, True),
+    }
@@ -2,38 +2,55 @@
 Minimal smoke tests for the Nextflow Chat Assistant backend.
 Run with: pytest test_main.py -v
 """
+import json
+import httpx
 import pytest
-from fastapi.testclient import TestClient
-from unittest.mock import patch, MagicMock
+import pytest_asyncio
+from unittest.mock import patch, MagicMock, AsyncMock, Mock
 from main import app
 
 
-@pytest.fixture
-def client():
-    """Create test client fixture."""
-    return TestClient(app)
+@pytest_asyncio.fixture(scope="module")
+async def client():
+    """ASGI client shared by the module (requests carry their own session ids).
+    
+    Calls the app directly on the test's event loop, with no TestClient thread hop.
+    """
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as ac:
+        yield ac
+
+
+@pytest.fixture(scope="module")
+def _llm_client_instance():
+    """LLMClient-specced mock, built once per module."""
+    from llm_client import LLMClient
+    return Mock(spec=LLMClient)
 
 
 @pytest.fixture
-def mock_llm_client():
+def mock_llm_client(_llm_client_instance, monkeypatch):
     """Mock LLM client to avoid real API calls in tests."""
-    with patch('main.LLMClient') as mock:
-        mock_instance = MagicMock()
-        mock_instance.complete = MagicMock(return_value="This is a test response about Nextflow.")
-        mock.return_value = mock_instance
-        yield mock_instance
+    import main
+    main.clear_query_caches()
+    _llm_client_instance.reset_mock(return_value=True, side_effect=True)
+    _llm_client_instance.acomplete.return_value = "This is a test response about Nextflow."
+    # Installed as the shared client, so get_llm_client never constructs one
+    monkeypatch.setattr(main, "llm_client", _llm_client_instance)
+    return _llm_client_instance
 
 
-def test_health_endpoint(client):
+@pytest.mark.asyncio
+async def test_health_endpoint(client):
     """Test the health check endpoint."""
-    response = client.get("/health")
+    response = await client.get("/health")
     assert response.status_code == 200
     assert response.json() == {"status": "ok"}
 
 
-def test_chat_endpoint_basic(client, mock_llm_client):
+@pytest.mark.asyncio
+async def test_chat_endpoint_basic(client, mock_llm_client):
     """Test basic chat endpoint functionality."""
-    response = client.post(
+    response = await client.post(
         "/chat",
         json={"message": "What is Nextflow?"}
     )
@@ -45,10 +62,11 @@ def test_chat_endpoint_basic(client, mock_llm_client):
     assert len(data["reply"]) > 0
 
 
-def test_chat_endpoint_with_session(client, mock_llm_client):
+@pytest.mark.asyncio
+async def test_chat_endpoint_with_session(client, mock_llm_client):
     """Test chat endpoint maintains session context."""
     # First message
-    response1 = client.post(
+    response1 = await client.post(
         "/chat",
         json={"message": "What is the latest version of Nextflow?"}
     )
@@ -57,7 +75,7 @@ def test_chat_endpoint_with_session(client, mock_llm_client):
     session_id = data1["session_id"]
     
     # Follow-up message in same session
-    response2 = client.post(
+    response2 = await client.post(
         "/chat",
         json={
             "message": "What was that version again?",
@@ -69,11 +87,128 @@ def test_chat_endpoint_with_session(client, mock_llm_client):
     assert data2["session_id"] == session_id
     assert "reply" in data2
 
-def test_chat_endpoint_empty_message(client):
+@pytest.mark.asyncio
+async def test_chat_stream_endpoint(client, mock_llm_client):
+    """Test streaming chat endpoint emits deltas then a final done event."""
+    async def fake_stream(messages, system_prompt=None):
+        for chunk in ["Nextflow ", "is great."]:
+            yield chunk
+    mock_llm_client.stream = fake_stream
+    
+    response = await client.post("/chat/stream", json={"message": "What is Nextflow?"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    
+    events = [
+        json.loads(line[len("data: "):])
+        for line in response.text.splitlines()
+        if line.startswith("data: ")
+    ]
+    assert [e["delta"] for e in events[:-1]] == ["Nextflow ", "is great."]
+    assert events[-1]["done"] is True
+    assert "session_id" in events[-1]
+
+
+@pytest.mark.asyncio
+async def test_llm_client_shared_across_requests(client):
+    """Test that one LLMClient instance serves multiple chat turns."""
+    with patch('main.LLMClient') as mock, patch('main.llm_client', None):
+        mock.return_value.acomplete = AsyncMock(return_value="Shared client reply.")
+        await client.post("/chat", json={"message": "What is Nextflow?"})
+        await client.post("/chat", json={"message": "What is a process?"})
+        assert mock.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_chat_endpoint_empty_message(client):
     """Test chat endpoint handles empty messages."""
-    response = client.post(
+    response = await client.post(
         "/chat",
         json={"message": ""}
     )
     assert response.status_code in [400, 422]
 
+
+@pytest.mark.asyncio
+async def test_chat_endpoint_oversized_message(client):
+    """Test that messages over MAX_INPUT_LENGTH are rejected before handling."""
+    import config
+    with patch('main.get_or_create_session') as mock_session:
+        response = await client.post(
+            "/chat",
+            json={"message": "a" * (config.MAX_INPUT_LENGTH + 1)}
+        )
+    assert response.status_code == 422
+    mock_session.assert_not_called()
+
+
+
+@pytest.mark.asyncio
+async def test_cors_preflight_vercel_origin(client):
+    """Test that Vercel preview domains pass the precompiled CORS regex."""
+    response = await client.options(
+        "/chat",
+        headers={
+            "Origin": "https://my-app-git-main.vercel.app",
+            "Access-Control-Request-Method": "POST",
+        }
+    )
+    assert response.status_code == 200
+    assert response.headers["access-control-allow-origin"] == "https://my-app-git-main.vercel.app"
+
+
+@pytest.mark.asyncio
+async def test_knowledge_context_cached_by_normalized_query():
+    """Test that repeated queries differing in case/whitespace hit the cache."""
+    import main
+    store = MagicMock()
+    store.search.return_value = [("Channels connect processes.", 0.9, {"url": "https://nextflow.io/docs/channel.html"})]
+    main.clear_query_caches()
+    with patch('main.vector_store_instance', store), \
+         patch('main.citation_extractor', main.CitationExtractor(store)):
+        first = await main.get_knowledge_context("What is a channel?")
+        second = await main.get_knowledge_context("  what is a   CHANNEL? ")
+    main.clear_query_caches()
+    
+    assert first == second
+    context, citations = first
+    assert "Channels connect processes." in context
+    assert citations == ["https://nextflow.io/docs/channel.html"]
+    # Context and citations come from a single search
+    store.search.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_knowledge_context_skips_short_queries():
+    """Test that greetings shorter than VECTOR_MIN_QUERY_CHARS never hit the vector store."""
+    import main
+    store = MagicMock()
+    with patch('main.vector_store_instance', store), patch('main.search_batcher', None):
+        assert await main.get_knowledge_context("  hi ") == ("", [])
+    store.search.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_first_turn_reply_cached(mock_llm_client):
+    """Test that repeated first-turn questions reuse the cached reply."""
+    import main
+    first = await main.get_llm_response("What version?", [], "ctx")
+    second = await main.get_llm_response("  what VERSION? ", [], "ctx")
+    assert first == second
+    assert mock_llm_client.acomplete.await_count == 1
+    
+    # Different context or an ongoing conversation goes to the LLM
+    await main.get_llm_response("What version?", [], "other ctx")
+    history = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}]
+    await main.get_llm_response("What version?", history, "ctx")
+    assert mock_llm_client.acomplete.await_count == 3
+    main.clear_query_caches()
+
+
+@pytest.mark.asyncio
+async def test_warmup_llm_swallows_errors(mock_llm_client):
+    """Test that a failing LLM warmup doesn't break startup."""
+    import main
+    mock_llm_client.acomplete = AsyncMock(side_effect=RuntimeError("no credentials"))
+    await main.warmup_llm(timeout=1.0)
+    mock_llm_client.acomplete.assert_awaited_once()
@@ -1,76 +1,202 @@
 """Unit tests for session_manager."""
 import pytest
+import session_manager
 from session_manager import (
     get_or_create_session, add_user_message, add_assistant_message,
-    get_conversation_history, clear_session, sessions
+    get_conversation_history, clear_session
 )
 
 
-def setup_function():
-    """Clear sessions before each test."""
-    sessions.clear()
+@pytest.fixture(autouse=True)
+def sessions(monkeypatch):
+    """Give each test its own in-memory session store."""
+    store = session_manager.new_session_store()
+    monkeypatch.setattr(session_manager, "sessions", store)
+    return store
 
 
-def test_get_or_create_session_new():
+@pytest.mark.asyncio
+async def test_get_or_create_session_new(sessions):
     """Test creating a new session."""
-    session_id = get_or_create_session()
+    session_id = await get_or_create_session()
     assert session_id is not None
     assert session_id in sessions
-    assert sessions[session_id] == []
+    assert list(sessions[session_id]) == []
 
 
-def test_get_or_create_session_existing():
+@pytest.mark.asyncio
+async def test_get_or_create_session_existing(sessions):
     """Test getting an existing session."""
-    session_id = get_or_create_session()
-    session_id2 = get_or_create_session(session_id)
+    session_id = await get_or_create_session()
+    session_id2 = await get_or_create_session(session_id)
     assert session_id == session_id2
     assert len(sessions) == 1
 
 
-def test_add_user_message():
+@pytest.mark.asyncio
+async def test_add_user_message():
     """Test adding a user message."""
-    session_id = get_or_create_session()
-    add_user_message(session_id, "Hello")
+    session_id = await get_or_create_session()
+    await add_user_message(session_id, "Hello")
     
-    history = get_conversation_history(session_id)
+    history = await get_conversation_history(session_id)
     assert len(history) == 1
     assert history[0]["role"] == "user"
     assert history[0]["content"] == "Hello"
-    assert "timestamp" in history[0]
+    assert isinstance(history[0]["timestamp"], int)
 
 
-def test_add_assistant_message():
+@pytest.mark.asyncio
+async def test_add_assistant_message():
     """Test adding an assistant message."""
-    session_id = get_or_create_session()
-    add_assistant_message(session_id, "Hi there!")
+    session_id = await get_or_create_session()
+    await add_assistant_message(session_id, "Hi there!")
     
-    history = get_conversation_history(session_id)
+    history = await get_conversation_history(session_id)
     assert len(history) == 1
     assert history[0]["role"] == "assistant"
     assert history[0]["content"] == "Hi there!"
     assert "timestamp" in history[0]
 
 
-def test_conversation_history():
+@pytest.mark.asyncio
+async def test_conversation_history():
     """Test getting conversation history."""
-    session_id = get_or_create_session()
-    add_user_message(session_id, "Hello")
-    add_assistant_message(session_id, "Hi!")
-    add_user_message(session_id, "How are you?")
+    session_id = await get_or_create_session()
+    await add_user_message(session_id, "Hello")
+    await add_assistant_message(session_id, "Hi!")
+    await add_user_message(session_id, "How are you?")
     
-    history = get_conversation_history(session_id)
+    history = await get_conversation_history(session_id)
     assert len(history) == 3
     assert history[0]["role"] == "user"
     assert history[1]["role"] == "assistant"
     assert history[2]["role"] == "user"
 
 
-def test_clear_session():
+@pytest.mark.asyncio
+async def test_clear_session(sessions):
     """Test clearing a session."""
-    session_id = get_or_create_session()
-    add_user_message(session_id, "Hello")
+    session_id = await get_or_create_session()
+    await add_user_message(session_id, "Hello")
     assert len(sessions[session_id]) == 1
     
-    clear_session(session_id)
+    await clear_session(session_id)
+    assert session_id not in sessions
+
+
+
+@pytest.mark.asyncio
+async def test_history_capped(monkeypatch):
+    """Test that only the most recent messages are kept per session."""
+    monkeypatch.setattr("config.SESSION_MAX_HISTORY", 3)
+    session_id = await get_or_create_session()
+    for i in range(5):
+        await add_user_message(session_id, f"msg {i}")
+    
+    history = await get_conversation_history(session_id)
+    assert [m["content"] for m in history] == ["msg 2", "msg 3", "msg 4"]
+
+
+@pytest.mark.asyncio
+async def test_sessions_bounded(sessions):
+    """Test that the session store evicts once it reaches its max size."""
+    for _ in range(sessions.maxsize + 1):
+        await get_or_create_session()
+    assert len(sessions) == sessions.maxsize
+
+
+class FakePipeline:
+    """Queues commands like a redis.asyncio pipeline and applies them on execute()."""
+    
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        self.commands = []
+    
+    def __getattr__(self, name):
+        return lambda *args: self.commands.append((name, args))
+    
+    async def execute(self):
+        for name, args in self.commands:
+            await getattr(self.client, name)(*args)
+
+
+class FakeRedis:
+    """Minimal in-memory stand-in for the redis.asyncio list/pipeline API."""
+    
+    def __init__(self):
+        self.lists = {}
+        self.ttls = {}
+    
+    def pipeline(self):
+        return FakePipeline(self)
+    
+    async def rpush(self, key, value):
+        self.lists.setdefault(key, []).append(value)
+    
+    async def ltrim(self, key, start, end):
+        self.lists[key] = self.lists[key][start:] if end == -1 else self.lists[key][start:end + 1]
+    
+    async def expire(self, key, ttl):
+        self.ttls[key] = ttl
+    
+    async def lrange(self, key, start, end):
+        return list(self.lists.get(key, []))
+    
+    async def delete(self, key):
+        self.lists.pop(key, None)
+
+
+class DownRedis(FakeRedis):
+    """Redis client whose server is unreachable."""
+    
+    def pipeline(self):
+        raise ConnectionError("Connection refused")
+    
+    async def expire(self, key, ttl):
+        raise ConnectionError("Connection refused")
+    
+    async def lrange(self, key, start, end):
+        raise ConnectionError("Connection refused")
+
+
+@pytest.mark.asyncio
+async def test_redis_session_store(monkeypatch, sessions):
+    """Test sessions round-trip through the Redis store when configured."""
+    fake = FakeRedis()
+    monkeypatch.setattr("session_manager.redis_client", fake)
+    monkeypatch.setattr("config.SESSION_MAX_HISTORY", 2)
+    
+    session_id = await get_or_create_session()
+    await add_user_message(session_id, "Hello")
+    await add_assistant_message(session_id, "Hi!")
+    await add_user_message(session_id, "How are you?")
+    
+    history = await get_conversation_history(session_id)
+    assert [m["role"] for m in history] == ["assistant", "user"]
+    assert history[1]["content"] == "How are you?"
+    assert isinstance(history[1]["timestamp"], int)
     assert session_id not in sessions
+    
+    await clear_session(session_id)
+    assert await get_conversation_history(session_id) == []
 
+
+@pytest.mark.asyncio
+async def test_redis_unavailable_falls_back_to_memory(monkeypatch, sessions):
+    """Test that a Redis outage degrades to in-memory sessions instead of failing."""
+    monkeypatch.setattr("session_manager.redis_client", DownRedis())
+    monkeypatch.setattr("session_manager.REDIS_UNAVAILABLE_ERRORS", (ConnectionError,))
+    
+    session_id = await get_or_create_session()
+    await add_user_message(session_id, "Hello")
+    
+    history = await get_conversation_history(session_id)
+    assert [m["content"] for m in history] == ["Hello"]
+    assert session_id in sessions
@@ -3,36 +3,43 @@ Tests for vector store functionality.
 """
 import pytest
 import numpy as np
-import tempfile
+import faiss
 import os
-from vector_store.embeddings import EmbeddingGenerator
-from vector_store.faiss_store import FAISSVectorStore
+from unittest.mock import patch
+from vector_store.faiss_store import FAISSVectorStore, IVF_PROBE_DIVISOR
 
 
-@pytest.fixture
-def embedding_gen():
-    """Create embedding generator for tests."""
-    return EmbeddingGenerator()
+SAMPLE_DOCUMENTS = (
+    "Nextflow is a workflow management system.",
+    "DSL2 is the new syntax for Nextflow.",
+    "Channels are used to pass data between processes.",
+)
+
+SAMPLE_METADATA = (
+    {"url": "https://nextflow.io/docs/", "source": "docs"},
+    {"url": "https://nextflow.io/docs/dsl2.html", "source": "docs"},
+    {"url": "https://nextflow.io/docs/channels.html", "source": "docs"},
+)
 
 
 @pytest.fixture
 def sample_documents():
     """Sample documents for testing."""
-    return [
-        "Nextflow is a workflow management system.",
-        "DSL2 is the new syntax for Nextflow.",
-        "Channels are used to pass data between processes.",
-    ]
+    return list(SAMPLE_DOCUMENTS)
 
 
 @pytest.fixture
 def sample_metadata():
     """Sample metadata for testing."""
-    return [
-        {"url": "https://nextflow.io/docs/", "source": "docs"},
-        {"url": "https://nextflow.io/docs/dsl2.html", "source": "docs"},
-        {"url": "https://nextflow.io/docs/channels.html", "source": "docs"},
-    ]
+    return [dict(m) for m in SAMPLE_METADATA]
+
+
+@pytest.fixture(scope="module")
+def prebuilt_store(embedding_gen):
+    """Store indexed over the sample documents once, for read-only tests."""
+    store = FAISSVectorStore(embedding_gen)
+    store.build_index(list(SAMPLE_DOCUMENTS), [dict(m) for m in SAMPLE_METADATA])
+    return store
 
 
 def test_faiss_store_initialization(embedding_gen):
@@ -55,6 +62,21 @@ def test_faiss_store_build_index(embedding_gen, sample_documents, sample_metadat
     assert len(store.metadata) == len(sample_metadata)
 
 
+def test_faiss_store_build_index_from_vectors(embedding_gen, sample_documents, sample_metadata):
+    """Test that building from precomputed embeddings matches build_index."""
+    store = FAISSVectorStore(embedding_gen)
+    store.build_index(sample_documents, sample_metadata)
+    
+    from_vectors = FAISSVectorStore(embedding_gen)
+    embeddings = from_vectors.embed_documents(sample_documents)
+    with patch.object(embedding_gen, "embed_batch") as embed_batch:
+        from_vectors.build_index_from_vectors(embeddings, sample_documents, sample_metadata)
+    
+    embed_batch.assert_not_called()
+    assert from_vectors.index.ntotal == store.index.ntotal
+    assert from_vectors.search("Nextflow workflow") == store.search("Nextflow workflow")
+
+
 def test_faiss_store_build_index_no_metadata(embedding_gen, sample_documents):
     """Test building an index without metadata."""
     store = FAISSVectorStore(embedding_gen)
@@ -68,27 +90,23 @@ def test_faiss_store_build_index_no_metadata(embedding_gen, sample_documents):
     assert all(isinstance(m, dict) for m in store.metadata)
 
 
-def test_faiss_store_search(embedding_gen, sample_documents, sample_metadata):
+def test_faiss_store_search(prebuilt_store):
     """Test searching the index."""
-    store = FAISSVectorStore(embedding_gen)
-    store.build_index(sample_documents, sample_metadata)
-    
-    results = store.search("Nextflow workflow", top_k=2)
+    results = prebuilt_store.search("Nextflow workflow", top_k=2)
     
     assert isinstance(results, list)
     assert len(results) > 0
     assert len(results) <= 2
     
     # Check result format: (text, similarity, metadata)
-    for result in results:
-        assert isinstance(result, tuple)
-        assert len(result) == 3
-        text, similarity, metadata = result
-        
-        assert isinstance(text, str)
-        assert isinstance(similarity, float)
-        assert isinstance(metadata, dict)
-        assert 0.0 <= similarity <= 1.0
+    assert all(isinstance(r, tuple) and len(r) == 3 for r in results)
+    texts, similarities, metadatas = zip(*results)
+    assert {type(t) for t in texts} == {str}
+    assert {type(s) for s in similarities} == {float}
+    assert {type(m) for m in metadatas} == {dict}
+    
+    sims = np.asarray(similarities)
+    assert np.all((sims >= 0.0) & (sims <= 1.0))
 
 
 def test_faiss_store_search_empty_index(embedding_gen):
@@ -98,62 +116,116 @@ def test_faiss_store_search_empty_index(embedding_gen):
     assert results == []
 
 
-def test_faiss_store_search_threshold(embedding_gen, sample_documents, sample_metadata):
+def test_faiss_store_search_threshold(prebuilt_store):
     """Test search with threshold filtering."""
-    store = FAISSVectorStore(embedding_gen)
-    store.build_index(sample_documents, sample_metadata)
-    
     # High threshold should return fewer results
-    results_high = store.search("Nextflow", top_k=10, threshold=0.9)
-    results_low = store.search("Nextflow", top_k=10, threshold=0.0)
+    query_embedding = prebuilt_store.encode_query("Nextflow")
+    results_high = prebuilt_store.search_embedding(query_embedding, top_k=10, threshold=0.9)
+    results_low = prebuilt_store.search_embedding(query_embedding, top_k=10, threshold=0.0)
     
     assert len(results_high) <= len(results_low)
     # All results should meet threshold
-    for _, similarity, _ in results_high:
-        assert similarity >= 0.9
+    assert all(similarity >= 0.9 for _, similarity, _ in results_high)
 
 
-def test_faiss_store_save_and_load(embedding_gen, sample_documents, sample_metadata):
+def test_faiss_store_save_and_load(embedding_gen, sample_documents, sample_metadata, tmp_path):
     """Test saving and loading index."""
-    with tempfile.TemporaryDirectory() as tmpdir:
-        index_path = os.path.join(tmpdir, "test_index.index")
-        
-        # Build and save
-        store1 = FAISSVectorStore(embedding_gen, index_path=index_path)
-        store1.build_index(sample_documents, sample_metadata)
-        
-        # Load into new store
-        store2 = FAISSVectorStore(embedding_gen, index_path=index_path)
-        store2.load(index_path)
-        
-        assert store2.index is not None
-        assert store2.index.ntotal == store1.index.ntotal
-        assert len(store2.documents) == len(store1.documents)
-        assert len(store2.metadata) == len(store1.metadata)
-        
-        # Search should work the same
-        results1 = store1.search("Nextflow")
-        results2 = store2.search("Nextflow")
-        
-        assert len(results1) == len(results2)
-        # Results should have same format
-        for result in results2:
-            assert isinstance(result, tuple)
-            assert len(result) == 3
+    index_path = os.path.join(tmp_path, "test_index.index")
+    
+    # Build and save
+    store1 = FAISSVectorStore(embedding_gen, index_path=index_path)
+    store1.build_index(sample_documents, sample_metadata)
+    
+    # Load into new store
+    store2 = FAISSVectorStore(embedding_gen, index_path=index_path)
+    store2.load(index_path)
+    
+    assert store2.index is not None
+    assert store2.index.ntotal == store1.index.ntotal
+    assert len(store2.documents) == len(store1.documents)
+    assert len(store2.metadata) == len(store1.metadata)
+    
+    # Search should work the same
+    results1 = store1.search("Nextflow")
+    results2 = store2.search("Nextflow")
+    
+    assert len(results1) == len(results2)
+    # Results should have same format
+    assert all(isinstance(r, tuple) and len(r) == 3 for r in results2)
+
+
+def test_faiss_store_load_legacy_pickle_data(embedding_gen, sample_documents, sample_metadata, tmp_path):
+    """Test that a .data file pickled by older versions still loads."""
+    import pickle
+    index_path = os.path.join(tmp_path, "legacy.index")
+    FAISSVectorStore(embedding_gen, index_path=index_path).build_index(sample_documents, sample_metadata)
+    with open(index_path.replace('.index', '.data'), 'wb') as f:
+        pickle.dump({'documents': sample_documents, 'metadata': sample_metadata, 'dimension': 384}, f)
+    
+    store = FAISSVectorStore(embedding_gen, index_path=index_path)
+    assert store.documents == sample_documents
+    assert store.metadata == sample_metadata
 
 
-def test_faiss_store_metadata_access(embedding_gen, sample_documents, sample_metadata):
+def test_faiss_store_flags_index_from_other_model_variant(embedding_gen, sample_documents, tmp_path):
+    """Test that the model variant is saved with the index and compared on load."""
+    def generator(model_variant):
+        gen = type(embedding_gen)()
+        gen.model_variant = model_variant
+        return gen
+    
+    index_path = os.path.join(tmp_path, "test.index")
+    FAISSVectorStore(generator("onnx:onnx/model_quint8_avx2.onnx"), index_path=index_path).build_index(sample_documents)
+    
+    assert not FAISSVectorStore(generator("onnx:onnx/model_quint8_avx2.onnx"), index_path=index_path).stale_model_variant
+    assert FAISSVectorStore(generator("onnx:onnx/model_qint8_avx512.onnx"), index_path=index_path).stale_model_variant
+    # Generators without a variant (test doubles) skip the check
+    assert not FAISSVectorStore(embedding_gen, index_path=index_path).stale_model_variant
+    
+    # Indexes saved before the variant was recorded count as stale
+    FAISSVectorStore(embedding_gen, index_path=index_path).build_index(sample_documents)
+    assert FAISSVectorStore(generator("torch:cpu:float32"), index_path=index_path).stale_model_variant
+
+
+def test_faiss_store_load_rejects_non_json_non_pickle_data(embedding_gen, sample_documents, tmp_path):
+    """Test that a .data file that is neither JSON nor a pickle-protocol file is never unpickled."""
+    import orjson
+    import pickle
+    index_path = os.path.join(tmp_path, "corrupt.index")
+    FAISSVectorStore(embedding_gen, index_path=index_path).build_index(sample_documents)
+    with open(index_path.replace('.index', '.data'), 'wb') as f:
+        f.write(pickle.dumps({'documents': sample_documents}, protocol=0))
+    
+    with patch("vector_store.faiss_store.pickle.loads") as loads:
+        with pytest.raises(orjson.JSONDecodeError):
+            FAISSVectorStore(embedding_gen, index_path=index_path)
+    loads.assert_not_called()
+
+
+def test_faiss_store_metadata_access(prebuilt_store):
     """Test that metadata is properly accessible in search results."""
+    results = prebuilt_store.search("Nextflow", top_k=3)
+    
+    assert {type(metadata) for _, _, metadata in results} == {dict}
+    # Check that we can access URL if it exists
+    assert all(isinstance(m['url'], str) for _, _, m in results if 'url' in m)
+
+
+def test_faiss_store_add_documents_in_slabs(embedding_gen, sample_documents, monkeypatch):
+    """Test that add_documents embeds and adds new documents in ADD_BATCH_SIZE slabs."""
+    from vector_store import faiss_store
+    monkeypatch.setattr(faiss_store, "ADD_BATCH_SIZE", 2)
     store = FAISSVectorStore(embedding_gen)
-    store.build_index(sample_documents, sample_metadata)
+    store.build_index(sample_documents)
+    initial_count = store.index.ntotal
     
-    results = store.search("Nextflow", top_k=3)
+    new_documents = [f"Nextflow executor number {i}" for i in range(5)]
+    with patch.object(embedding_gen, "embed_batch", wraps=embedding_gen.embed_batch) as embed_batch:
+        store.add_documents(new_documents)
     
-    for text, similarity, metadata in results:
-        assert isinstance(metadata, dict)
-        # Check that we can access URL if it exists
-        if 'url' in metadata:
-            assert isinstance(metadata['url'], str)
+    assert [len(c.args[0]) for c in embed_batch.call_args_list] == [2, 2, 1]
+    assert store.index.ntotal == initial_count + len(new_documents)
+    assert store.search("Nextflow executor number 4", top_k=1)[0][0] == new_documents[4]
 
 
 def test_faiss_store_metadata_mismatch(embedding_gen):
@@ -175,6 +247,91 @@ def test_faiss_store_metadata_mismatch(embedding_gen):
         assert isinstance(meta, dict)
 
 
+@pytest.mark.integration
+def test_faiss_store_real_embeddings(real_embedding_gen, sample_documents, sample_metadata):
+    """Test retrieval quality end to end with the real sentence-transformers model."""
+    store = FAISSVectorStore(real_embedding_gen)
+    store.build_index(sample_documents, sample_metadata)
+    
+    results = store.search("How do processes exchange data?", top_k=1)
+    
+    assert results[0][0] == "Channels are used to pass data between processes."
+    assert results[0][2]["url"] == "https://nextflow.io/docs/channels.html"
+
+
+RECALL_DOCUMENTS = SAMPLE_DOCUMENTS + (
+    "Processes are the basic processing primitive that execute a user script.",
+    "Executors determine where tasks run, such as Slurm, AWS Batch or Kubernetes.",
+    "Configuration files set parameters, profiles and executor options.",
+    "Operators transform channel contents, for example map, filter and collect.",
+    "Containers such as Docker or Singularity make pipelines reproducible.",
+    "The work directory holds task outputs and enables resuming with -resume.",
+    "Workflow parameters are declared with params and set on the command line.",
+)
+
+RECALL_QUERIES = (
+    "How do processes exchange data?",
+    "What is DSL2?",
+    "How do I run tasks on a cluster?",
+    "How can I resume a failed pipeline?",
+    "How do I use Docker containers?",
+    "How do I filter items in a channel?",
+)
+
+
+@pytest.mark.integration
+def test_int8_embeddings_match_fp32_ranking(real_embedding_gen, monkeypatch):
+    """Test that the default INT8 model ranks documents like the FP32 model does."""
+    from vector_store.embeddings import EmbeddingGenerator
+    assert not real_embedding_gen.model_variant.endswith("float32")
+    monkeypatch.setenv("EMBEDDING_BACKEND", "torch")
+    monkeypatch.setenv("EMBEDDING_QUANTIZE", "0")
+    fp32_gen = EmbeddingGenerator()
+    assert fp32_gen.model_variant.endswith("float32")
+    
+    int8_store, fp32_store = FAISSVectorStore(real_embedding_gen), FAISSVectorStore(fp32_gen)
+    int8_store.build_index(list(RECALL_DOCUMENTS))
+    fp32_store.build_index(list(RECALL_DOCUMENTS))
+    
+    int8_vectors = real_embedding_gen.embed_batch(list(RECALL_DOCUMENTS))
+    fp32_vectors = fp32_gen.embed_batch(list(RECALL_DOCUMENTS))
+    assert np.min(np.sum(int8_vectors * fp32_vectors, axis=1)) > 0.95
+    
+    overlap = []
+    for int8_hits, fp32_hits in zip(int8_store.search_batch(list(RECALL_QUERIES), top_k=3),
+                                    fp32_store.search_batch(list(RECALL_QUERIES), top_k=3)):
+        assert int8_hits[0][0] == fp32_hits[0][0]
+        overlap.append(len({h[0] for h in int8_hits} & {h[0] for h in fp32_hits}) / 3)
+    # Recall@3 of INT8 against FP32 as ground truth
+    assert np.mean(overlap) >= 0.85
+
+
+def test_embedding_generator_shares_models_per_onnx_file(monkeypatch):
+    """Test that a changed ONNX export loads its own model and reports its own variant."""
+    from unittest.mock import MagicMock
+    from vector_store import embeddings
+    if not embeddings.SENTENCE_TRANSFORMERS_AVAILABLE:
+        pytest.skip("sentence-transformers not installed")
+    monkeypatch.setattr(embeddings, "_SHARED_MODELS", {})
+    monkeypatch.setattr(embeddings.torch.cuda, "is_available", lambda: False)
+    monkeypatch.setenv("EMBEDDING_BACKEND", "onnx")
+    
+    def load(self, num_threads, onnx_file):
+        return MagicMock(max_seq_length=256), "onnx", f"onnx:{onnx_file}"
+    
+    with patch.object(embeddings.EmbeddingGenerator, "_load_model", autospec=True, side_effect=load) as loader:
+        monkeypatch.setenv("EMBEDDING_ONNX_FILE", "onnx/model_quint8_avx2.onnx")
+        first = embeddings.EmbeddingGenerator()
+        same = embeddings.EmbeddingGenerator()
+        monkeypatch.setenv("EMBEDDING_ONNX_FILE", "onnx/model_qint8_avx512.onnx")
+        other = embeddings.EmbeddingGenerator()
+    
+    assert loader.call_count == 2
+    assert same.model is first.model and other.model is not first.model
+    assert first.model_variant == same.model_variant == "onnx:onnx/model_quint8_avx2.onnx"
+    assert other.model_variant == "onnx:onnx/model_qint8_avx512.onnx"
+
+
 def test_faiss_store_single_result(embedding_gen):
     """Test search when there's only one document."""
     store = FAISSVectorStore(embedding_gen)
@@ -188,3 +345,232 @@ def test_faiss_store_single_result(embedding_gen):
     assert isinstance(similarity, float)
     assert isinstance(metadata, dict)
 
+
+
+def test_faiss_store_index_factory_ivf(embedding_gen):
+    """Test building an IVF index from a factory string with {nlist}."""
+    documents = [f"Nextflow process number {i} uses channel {i % 7}" for i in range(300)]
+    store = FAISSVectorStore(embedding_gen, index_factory="IVF{nlist},Flat", nprobe=8)
+    store.build_index(documents)
+    
+    ivf = faiss.extract_index_ivf(store.index)
+    assert ivf.nlist == int(4 * np.sqrt(len(documents)))
+    assert ivf.nprobe == 8
+    assert store.index.ntotal == len(documents)
+    assert len(store.search("Nextflow process number 5", top_k=3)) > 0
+
+
+def test_faiss_store_ivf_nprobe_scales_with_nlist(embedding_gen):
+    """Test that IVF probes a fixed share of its lists and matches exact search scores."""
+    import random
+    rng = random.Random(0)
+    topics = [[f"topic{t}word{j}" for j in range(6)] for t in range(40)]
+    
+    def text(noise_words):
+        words = rng.sample(rng.choice(topics), 4) + [f"noise{rng.randrange(3000)}" for _ in range(noise_words)]
+        return " ".join(words)
+    
+    documents = [text(4) for _ in range(3000)]
+    queries = [text(2) for _ in range(50)]
+    ivf_store = FAISSVectorStore(embedding_gen, index_factory="IVF{nlist},Flat", nprobe=1)
+    ivf_store.build_index(documents)
+    flat_store = FAISSVectorStore(embedding_gen)
+    flat_store.build_index(documents)
+    
+    ivf = faiss.extract_index_ivf(ivf_store.index)
+    assert ivf.nprobe == ivf.nlist // IVF_PROBE_DIVISOR
+    # Compare scores rather than ids: many documents tie on score
+    for ivf_results, flat_results in zip(ivf_store.search_batch(queries, top_k=5), flat_store.search_batch(queries, top_k=5)):
+        assert [r[1] for r in ivf_results] == pytest.approx([r[1] for r in flat_results])
+
+
+def test_faiss_store_index_factory_hnsw(embedding_gen, sample_documents, tmp_path):
+    """Test building an HNSW index and applying efSearch after a reload."""
+    index_path = os.path.join(tmp_path, "hnsw.index")
+    store = FAISSVectorStore(embedding_gen, index_path=index_path, index_factory="HNSW32", ef_search=40)
+    store.build_index(sample_documents)
+    
+    assert isinstance(store.index, faiss.IndexHNSWFlat)
+    assert store.index.hnsw.efSearch == 40
+    assert len(store.search("Nextflow workflow", top_k=2)) > 0
+    
+    reloaded = FAISSVectorStore(embedding_gen, index_path=index_path, ef_search=24)
+    assert faiss.downcast_index(reloaded.index).hnsw.efSearch == 24
+    assert reloaded.search("Nextflow workflow", top_k=2) == store.search("Nextflow workflow", top_k=2)
+
+
+def test_faiss_store_index_factory_sq8(embedding_gen, sample_documents, sample_metadata):
+    """Test that an 8-bit scalar-quantized index keeps the flat index's ranking."""
+    flat = FAISSVectorStore(embedding_gen)
+    flat.build_index(sample_documents, sample_metadata)
+    store = FAISSVectorStore(embedding_gen, index_factory="SQ8")
+    store.build_index(sample_documents, sample_metadata)
+    
+    assert isinstance(store.index, faiss.IndexScalarQuantizer)
+    assert store.index.sa_code_size() == store.dimension
+    results = store.search("Nextflow workflow", top_k=3)
+    assert [r[0] for r in results] == [r[0] for r in flat.search("Nextflow workflow", top_k=3)]
+
+
+def test_faiss_store_index_factory_fallback(embedding_gen, sample_documents):
+    """Test that a PQ factory falls back to a flat index on tiny corpora."""
+    store = FAISSVectorStore(embedding_gen, index_factory="OPQ32_64,IVF{nlist},PQ32")
+    store.build_index(sample_documents)
+    
+    assert isinstance(store.index, faiss.IndexFlatIP)
+    assert store.index.ntotal == len(sample_documents)
+
+
+def test_select_index_factory_tiers():
+    """Test that index_factory="auto" picks a tier by corpus size."""
+    assert FAISSVectorStore.select_index_factory(500) == ""
+    assert FAISSVectorStore.select_index_factory(50_000) == "IVF{nlist},Flat"
+    assert FAISSVectorStore.select_index_factory(5_000_000) == "OPQ32_128,IVF4096,PQ32"
+
+
+def test_faiss_store_index_factory_auto_small(embedding_gen, sample_documents):
+    """Test that "auto" keeps small corpora on an exact flat index."""
+    store = FAISSVectorStore(embedding_gen, index_factory="auto")
+    store.build_index(sample_documents)
+    
+    assert isinstance(store.index, faiss.IndexFlatIP)
+
+
+def test_faiss_store_binary_quantize(embedding_gen, sample_documents, sample_metadata, tmp_path):
+    """Test binary candidate retrieval with reranking and persistence."""
+    index_path = os.path.join(tmp_path, "test.index")
+    store = FAISSVectorStore(embedding_gen, index_path=index_path, binary_quantize=True)
+    store.build_index(sample_documents, sample_metadata)
+    
+    assert store.binary_index.ntotal == len(sample_documents)
+    assert os.path.exists(os.path.join(tmp_path, "test.bindex"))
+    
+    results = store.search("Channels pass data between processes", top_k=2)
+    assert results[0][0] == sample_documents[2]
+    assert results[0][1] >= results[-1][1]
+    
+    loaded = FAISSVectorStore(embedding_gen, index_path=index_path, binary_quantize=True)
+    assert loaded.binary_index.ntotal == len(sample_documents)
+
+
+def test_faiss_store_search_batch(embedding_gen, sample_documents, sample_metadata):
+    """Test that batched search matches per-query search."""
+    store = FAISSVectorStore(embedding_gen)
+    store.build_index(sample_documents, sample_metadata)
+    
+    queries = ["Nextflow workflow", "Channels pass data"]
+    batched = store.search_batch(queries, top_k=2)
+    
+    assert len(batched) == len(queries)
+    for query, results in zip(queries, batched):
+        assert [r[0] for r in results] == [r[0] for r in store.search(query, top_k=2)]
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/maps"), reason="needs /proc/self/maps")
+@pytest.mark.parametrize("index_factory", ["", "IVF{nlist},Flat", "IVF{nlist},PQ16x4"])
+def test_faiss_store_mmap_load(embedding_gen, index_factory, tmp_path):
+    """Test that a saved index is really memory-mapped on load, not read into memory."""
+    documents = [f"Nextflow process {i} uses channel operator {i % 7}" for i in range(300)]
+    index_path = os.path.join(tmp_path, "test.index")
+    built = FAISSVectorStore(embedding_gen, index_path=index_path, index_factory=index_factory)
+    built.build_index(documents)
+    assert (faiss.try_extract_index_ivf(built.index) is not None) == bool(index_factory)
+    
+    store = FAISSVectorStore(embedding_gen, index_path=index_path, mmap=True)
+    assert store.index.ntotal == len(documents)
+    with open("/proc/self/maps") as f:
+        assert os.path.realpath(index_path) in f.read()
+    assert len(store.search("Nextflow process", top_k=2)) > 0
+
+
+@pytest.mark.skipif(not hasattr(os, "posix_fadvise"), reason="needs posix_fadvise")
+def test_faiss_store_prefetch(tmp_path):
+    """Test that prefetch advises WILLNEED over the whole index file, and skips missing files."""
+    path = os.path.join(tmp_path, "test.index")
+    with open(path, "wb") as f:
+        f.write(b"\0" * 4096)
+    
+    advised = []
+    
+    def record(fd, offset, length, advice):
+        # The descriptor is closed after the call, so resolve it to its file now
+        advised.append((os.path.samestat(os.fstat(fd), os.stat(path)), offset, length, advice))
+    
+    with patch("os.posix_fadvise", side_effect=record) as fadvise:
+        FAISSVectorStore._prefetch(path)
+        fadvise.assert_called_once()
+        assert advised == [(True, 0, 0, os.POSIX_FADV_WILLNEED)]
+        
+        fadvise.reset_mock()
+        FAISSVectorStore._prefetch(os.path.join(tmp_path, "missing.index"))
+        fadvise.assert_not_called()
+
+
+def test_prepare_documents_drops_duplicate_chunks(tmp_path):
+    """Test that identical doc text is only prepared for indexing once."""
+    from vector_store.document_loader import prepare_documents_for_indexing
+    for name in ("channel.md", "process.md"):
+        (tmp_path / name).write_text("Shared boilerplate paragraph that several documentation pages repeat.\n")
+    (tmp_path / "config.md").write_text("Configuration scopes and profiles are declared in nextflow.config files.\n")
+    
+    texts, metadata = prepare_documents_for_indexing(docs_dir=str(tmp_path))
+    
+    assert len(texts) == len(metadata) == 2
+    assert len(set(texts)) == 2
+
+
+@pytest.mark.parametrize("index_factory", ["", "SQ8", "HNSW32", "IVF{nlist},Flat"])
+def test_faiss_store_add_documents_after_mmap_load(embedding_gen, index_factory, tmp_path):
+    """Test that adding to a memory-mapped index re-reads it into memory instead of aborting."""
+    documents = [f"Nextflow process {i} uses channel operator {i % 7}" for i in range(300)]
+    index_path = os.path.join(tmp_path, "test.index")
+    FAISSVectorStore(embedding_gen, index_path=index_path, index_factory=index_factory).build_index(documents)
+    
+    store = FAISSVectorStore(embedding_gen, index_path=index_path, mmap=True)
+    assert store.mapped_path == index_path
+    store.add_documents(["Nextflow executors run tasks on Slurm clusters"])
+    
+    assert store.mapped_path is None
+    assert store.index.ntotal == len(documents) + 1
+    reloaded = FAISSVectorStore(embedding_gen, index_path=index_path)
+    assert reloaded.index.ntotal == len(documents) + 1
+    assert reloaded.documents[-1] == "Nextflow executors run tasks on Slurm clusters"
+
+
+def test_faiss_store_save_is_atomic(embedding_gen, sample_documents, sample_metadata, tmp_path):
+    """Test that saving leaves no temporary files behind."""
+    index_path = os.path.join(tmp_path, "test.index")
+    store = FAISSVectorStore(embedding_gen, index_path=index_path)
+    store.build_index(sample_documents, sample_metadata)
+    
+    assert sorted(os.listdir(tmp_path)) == ["test.data", "test.index"]
+
+
+def test_faiss_store_threshold_range_search(embedding_gen):
+    """Test that thresholded search returns the same hits as filtering top-k."""
+    documents = [f"Nextflow channel operator number {i}" for i in range(50)]
+    store = FAISSVectorStore(embedding_gen)
+    store.build_index(documents)
+    
+    query = "Nextflow channel operator number 7"
+    thresholded = store.search(query, top_k=5, threshold=0.5)
+    unfiltered = [r for r in store.search(query, top_k=5) if r[1] >= 0.5]
+    
+    # Ties may come back in a different order, so compare scores and the best hit
+    assert [r[1] for r in thresholded] == pytest.approx([r[1] for r in unfiltered])
+    assert thresholded[0][0] == query
+    assert all(r[1] >= 0.5 for r in thresholded)
+
+
+def test_faiss_store_threshold_is_inclusive(embedding_gen):
+    """Test that a hit scoring exactly at the threshold is kept, as with top-k filtering."""
+    documents = [f"Nextflow channel operator number {i}" for i in range(50)]
+    store = FAISSVectorStore(embedding_gen)
+    store.build_index(documents)
+    
+    query = "Nextflow channel operator number 7"
+    boundary = store.search(query, top_k=2)[1]
+    thresholded = store.search(query, top_k=2, threshold=boundary[1])
+    
+    assert len(thresholded) == 2
+    assert thresholded[1][1] == boundary[1]
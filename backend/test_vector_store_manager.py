@@ -0,0 +1,102 @@
+"""Unit tests for vector_store_manager."""
+import fcntl
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+import vector_store_manager
+from vector_store.faiss_store import FAISSVectorStore
+from vector_store.index_utils import check_index_exists
+from vector_store_manager import _build_lock, _embedding_cache_path, load_or_build_index
+
+
+def _store(model_variant):
+    return SimpleNamespace(embedding_generator=SimpleNamespace(model_variant=model_variant))
+
+
+def test_embedding_cache_path_keyed_by_model_variant(tmp_path):
+    """Test that cached embeddings are only shared by the same chunks and model variant."""
+    index_path = str(tmp_path / "vector_index.index")
+    texts = ["Nextflow channels", "Nextflow processes"]
+    avx2 = _embedding_cache_path(index_path, _store("onnx:onnx/model_quint8_avx2.onnx"), texts)
+    
+    assert avx2 == _embedding_cache_path(index_path, _store("onnx:onnx/model_quint8_avx2.onnx"), list(texts))
+    assert avx2.startswith(str(tmp_path))
+    for variant in ("onnx:onnx/model_qint8_avx512.onnx", "torch:cpu:qint8", "torch:cpu:float32"):
+        assert _embedding_cache_path(index_path, _store(variant), texts) != avx2
+    assert _embedding_cache_path(index_path, _store("onnx:onnx/model_quint8_avx2.onnx"), texts[:1]) != avx2
+
+
+def test_build_lock_is_exclusive(tmp_path):
+    """Test that a second worker cannot take the build lock while it is held."""
+    index_path = str(tmp_path / "vector_index.index")
+    with _build_lock(index_path):
+        with open(f"{index_path}.lock", "w") as other:
+            with pytest.raises(BlockingIOError):
+                fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    with open(f"{index_path}.lock", "w") as other:
+        fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def test_load_or_build_index_loads_index_built_by_another_worker(embedding_gen, monkeypatch, tmp_path):
+    """Test that a worker that waited on the build lock loads the finished index instead of rebuilding."""
+    index_path = str(tmp_path / "vector_index.index")
+    monkeypatch.setattr("config.VECTOR_INDEX_PATH", index_path)
+    monkeypatch.setattr("config.NEXTFLOW_DOCS_DIR", str(tmp_path))
+    documents = ["Nextflow channels connect processes", "Nextflow processes run tasks"]
+    store = FAISSVectorStore(embedding_gen, index_path=index_path)
+    
+    def built_while_waiting():
+        # Another worker finishes the build while this one waits for the lock
+        yield False, index_path, index_path.replace(".index", ".data")
+        FAISSVectorStore(embedding_gen, index_path=index_path).build_index(documents)
+        while True:
+            yield check_index_exists()
+    
+    checks = built_while_waiting()
+    with patch.object(vector_store_manager, "check_index_exists", side_effect=lambda: next(checks)), \
+            patch.object(vector_store_manager, "prepare_documents_for_indexing") as prepare:
+        load_or_build_index(store)
+    
+    prepare.assert_not_called()
+    assert store.index.ntotal == len(documents)
+    assert store.documents == documents
+
+
+def test_load_or_build_index_rebuilds_index_from_other_model_variant(embedding_gen, monkeypatch, tmp_path):
+    """Test that an index embedded by another model variant is rebuilt from the docs."""
+    docs_dir = tmp_path / "docs"
+    docs_dir.mkdir()
+    (docs_dir / "channel.md").write_text("Channels connect Nextflow processes and carry their data.\n")
+    index_path = str(tmp_path / "vector_index.index")
+    monkeypatch.setattr("config.VECTOR_INDEX_PATH", index_path)
+    monkeypatch.setattr("config.NEXTFLOW_DOCS_DIR", str(docs_dir))
+    
+    old_gen, new_gen = type(embedding_gen)(), type(embedding_gen)()
+    old_gen.model_variant, new_gen.model_variant = "torch:cpu:float32", "onnx:onnx/model_quint8_avx2.onnx"
+    FAISSVectorStore(old_gen, index_path=index_path).build_index(["Stale chunk one", "Stale chunk two"])
+    
+    store = FAISSVectorStore(new_gen, index_path=index_path)
+    assert store.stale_model_variant
+    load_or_build_index(store)
+    
+    assert not store.stale_model_variant
+    assert store.documents == ["Channels connect Nextflow processes and carry their data."]
+    assert not FAISSVectorStore(new_gen, index_path=index_path).stale_model_variant
+
+
+def test_load_or_build_index_keeps_stale_index_without_docs(embedding_gen, monkeypatch, tmp_path):
+    """Test that a stale index keeps serving when there are no docs to rebuild it from."""
+    index_path = str(tmp_path / "vector_index.index")
+    monkeypatch.setattr("config.VECTOR_INDEX_PATH", index_path)
+    monkeypatch.setattr("config.NEXTFLOW_DOCS_DIR", str(tmp_path / "missing-docs"))
+    old_gen, new_gen = type(embedding_gen)(), type(embedding_gen)()
+    old_gen.model_variant, new_gen.model_variant = "torch:cpu:float32", "onnx:onnx/model_quint8_avx2.onnx"
+    FAISSVectorStore(old_gen, index_path=index_path).build_index(["Stale chunk one", "Stale chunk two"])
+    
+    store = FAISSVectorStore(new_gen, index_path=index_path)
+    load_or_build_index(store)
+    
+    assert store.stale_model_variant
+    assert store.documents == ["Stale chunk one", "Stale chunk two"]
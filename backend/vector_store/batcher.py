@@ -0,0 +1,123 @@
+"""
+Micro-batching for concurrent vector store searches.
+
+Queries arriving within a short window are embedded in one forward pass and
+searched with one FAISS call instead of one call each.
+"""
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+
+import faiss
+
+from .faiss_store import FAISSVectorStore
+
+logger = logging.getLogger(__name__)
+
+
+class SearchBatcher:
+    """Coalesce concurrent search requests into batched FAISSVectorStore searches."""
+
+    def __init__(
+        self,
+        vector_store: FAISSVectorStore,
+        max_batch_size: int = 32,
+        max_wait: float = 0.008,
+        max_threads: int = 1
+    ):
+        """
+        Initialize batcher.
+
+        Args:
+            vector_store: Store whose search_batch serves the requests
+            max_batch_size: Maximum queries per batch
+            max_wait: Seconds to wait for more queries after the first arrives
+            max_threads: Most FAISS OpenMP threads one batch may use (the CPU budget)
+        """
+        self.vector_store = vector_store
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_threads = max(1, max_threads)
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Start the background batching loop (call from a running event loop)."""
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the batching loop."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def submit(
+        self,
+        query: str,
+        top_k: int = 3,
+        threshold: float = 0.0
+    ) -> List[Tuple[str, float, dict]]:
+        """Queue a search and wait for its results."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((query, top_k, threshold, future))
+        return await future
+
+    def _search_batch(self, queries: List[str], top_k: int, threshold: float):
+        """Run one batched search, letting FAISS use a few OpenMP threads for it.
+
+        The OpenMP thread count is per calling thread, so this only affects the
+        executor thread running the batch; it is reset for reuse afterwards.
+        """
+        faiss.omp_set_num_threads(min(self.max_threads, len(queries)))
+        try:
+            return self.vector_store.search_batch(queries, top_k, threshold)
+        finally:
+            faiss.omp_set_num_threads(1)
+
+    async def _collect(self) -> list:
+        """Wait for one request, then gather more until the batch is full or the window closes."""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+
+            # Requests normally share top_k/threshold; group just in case
+            groups = {}
+            for query, top_k, threshold, future in batch:
+                groups.setdefault((top_k, threshold), []).append((query, future))
+
+            for (top_k, threshold), items in groups.items():
+                queries = [query for query, _ in items]
+                try:
+                    # Embedding + search are CPU-bound; keep the event loop free
+                    results = await loop.run_in_executor(
+                        None, self._search_batch, queries, top_k, threshold
+                    )
+                except Exception as e:
+                    logger.error(f"Batched vector search failed: {e}", exc_info=True)
+                    for _, future in items:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+
+                for (_, future), result in zip(items, results):
+                    if not future.done():
+                        future.set_result(result)
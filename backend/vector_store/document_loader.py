@@ -1,29 +1,52 @@
 """
 Load and chunk Nextflow documentation for vector store.
 """
-from typing import List, Dict
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List
+import hashlib
 import re
 import os
 from pathlib import Path
 
+# Markdown artifacts stripped from every doc file in one pass:
+# reference-style links like {ref}`process-page` and page markers like (executor-page)=
+_MARKDOWN_ARTIFACT_RE = re.compile(r'\{ref\}`[^`]+`|^\([^)]+\)=\s*$', re.MULTILINE)
 
-def load_markdown_file(file_path: Path) -> str:
+# Sentence endings / line breaks where chunk_text prefers to split
+_CHUNK_BREAK_RE = re.compile(r'[.\n]')
+
+# Doc sections with their own URL prefix, checked in order against the relative path
+URL_SECTIONS = ('developer', 'reference', 'tutorials', 'guides', 'migrations', 'plugins')
+
+# (keyword, category) pairs; the first keyword found in the lowercased
+# relative path (which includes the file stem) wins
+CATEGORY_KEYWORDS = (
+    ('executor', 'executor'),
+    ('channel', 'channel'),
+    ('process', 'process'),
+    ('config', 'config'),
+    ('dsl', 'dsl'),
+    ('migration', 'dsl'),
+)
+
+
+def load_markdown_file(file_path: str) -> str:
     """Load and clean markdown file content."""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        # One read + one decode; newlines are normalized on the bytes like text mode would
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        content = data.replace(b'\r\n', b'\n').replace(b'\r', b'\n').decode('utf-8')
         # Basic cleaning: remove some markdown artifacts but keep structure
-        # Remove reference-style links like {ref}`process-page`
-        content = re.sub(r'\{ref\}`[^`]+`', '', content)
-        # Remove page markers like (executor-page)=
-        content = re.sub(r'^\([^)]+\)=\s*$', '', content, flags=re.MULTILINE)
+        content = _MARKDOWN_ARTIFACT_RE.sub('', content)
         return content.strip()
     except Exception as e:
         print(f"Error loading {file_path}: {e}")
         return ""
 
 
-def chunk_text(text: str, chunk_size: int = 300, overlap: int = 50) -> List[str]:
+def chunk_text(text: str, chunk_size: int = 300, overlap: int = 50) -> Iterator[str]:
     """
     Split text into overlapping chunks.
     
@@ -32,14 +55,16 @@ def chunk_text(text: str, chunk_size: int = 300, overlap: int = 50) -> List[str]
         chunk_size: Approximate number of tokens per chunk
         overlap: Number of tokens to overlap between chunks
     
-    Returns:
-        List of text chunks
+    Yields:
+        Text chunks, in order
     """
     # Simple token approximation (1 token ≈ 4 characters)
     char_size = chunk_size * 4
     char_overlap = overlap * 4
     
-    chunks = []
+    # Offsets of every sentence ending, found once; each window bisects them
+    breaks = [m.start() for m in _CHUNK_BREAK_RE.finditer(text)]
+    
     start = 0
     
     while start < len(text):
@@ -48,19 +73,16 @@ def chunk_text(text: str, chunk_size: int = 300, overlap: int = 50) -> List[str]
         
         # Try to break at sentence boundaries
         if end < len(text):
-            # Look for sentence endings
-            last_period = chunk.rfind('.')
-            last_newline = chunk.rfind('\n')
-            break_point = max(last_period, last_newline)
+            # Last sentence ending inside the window (relative to start)
+            i = bisect_left(breaks, end) - 1
+            break_point = breaks[i] - start if i >= 0 else -1
             
             if break_point > char_size * 0.7:  # If we found a good break point
                 chunk = chunk[:break_point + 1]
                 end = start + break_point + 1
         
-        chunks.append(chunk.strip())
+        yield chunk.strip()
         start = end - char_overlap
-    
-    return chunks
 
 
 def load_docs_from_directory(docs_dir: str) -> List[Dict]:
@@ -84,62 +106,51 @@ def load_docs_from_directory(docs_dir: str) -> List[Dict]:
     exclude_dirs = {'_static', '_templates', 'snippets', 'diagrams'}
     exclude_files = {'README.md', 'LICENCE.txt', 'conf.py', 'Makefile', 'Dockerfile', 'netlify.toml'}
     
+    # Walk with os.scandir: DirEntry caches the file type, excluded directories
+    # are never entered, and paths stay plain strings (no per-file Path objects)
+    root = str(docs_path)
+    prefix_len = len(os.path.join(root, ''))
     md_files = []
-    for md_file in docs_path.rglob('*.md'):
-        # Skip excluded directories
-        if any(excluded in md_file.parts for excluded in exclude_dirs):
-            continue
-        # Skip excluded files
-        if md_file.name in exclude_files:
-            continue
-        md_files.append(md_file)
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    # Skip excluded directories
+                    if entry.name not in exclude_dirs:
+                        stack.append(entry.path)
+                # Skip excluded files
+                elif entry.name.endswith('.md') and entry.name not in exclude_files:
+                    md_files.append(entry.path)
     
     print(f"Found {len(md_files)} markdown files to process")
     
-    for md_file in md_files:
-        content = load_markdown_file(md_file)
+    # File reads release the GIL, so loading overlaps across threads; map keeps file order
+    with ThreadPoolExecutor(max_workers=min(16, len(md_files) or 1)) as executor:
+        contents = list(executor.map(load_markdown_file, md_files))
+    
+    for md_file, content in zip(md_files, contents):
         if not content or len(content) < 50:  # Skip very short files
             continue
         
         # Determine URL from file path
         # Map local path to nextflow.io docs URL
-        relative_path = md_file.relative_to(docs_path)
-        file_stem = md_file.stem
+        relative_str = md_file[prefix_len:]
+        relative_lower = relative_str.lower()
+        file_stem = os.path.splitext(os.path.basename(md_file))[0]
         
         # Build URL (approximate mapping)
         base_url = "https://www.nextflow.io/docs/latest"
-        if 'developer' in str(relative_path):
-            url = f"{base_url}/developer/{file_stem}.html"
-        elif 'reference' in str(relative_path):
-            url = f"{base_url}/reference/{file_stem}.html"
-        elif 'tutorials' in str(relative_path):
-            url = f"{base_url}/tutorials/{file_stem}.html"
-        elif 'guides' in str(relative_path):
-            url = f"{base_url}/guides/{file_stem}.html"
-        elif 'migrations' in str(relative_path):
-            url = f"{base_url}/migrations/{file_stem}.html"
-        elif 'plugins' in str(relative_path):
-            url = f"{base_url}/plugins/{file_stem}.html"
-        else:
-            url = f"{base_url}/{file_stem}.html"
+        section = next((s for s in URL_SECTIONS if s in relative_str), None)
+        url = f"{base_url}/{section}/{file_stem}.html" if section else f"{base_url}/{file_stem}.html"
         
         # Extract category from path
-        category = 'general'
-        if 'executor' in str(relative_path).lower() or 'executor' in file_stem.lower():
-            category = 'executor'
-        elif 'channel' in str(relative_path).lower() or 'channel' in file_stem.lower():
-            category = 'channel'
-        elif 'process' in str(relative_path).lower() or 'process' in file_stem.lower():
-            category = 'process'
-        elif 'config' in str(relative_path).lower() or 'config' in file_stem.lower():
-            category = 'config'
-        elif 'dsl' in str(relative_path).lower() or 'migration' in str(relative_path).lower():
-            category = 'dsl'
+        category = next((c for keyword, c in CATEGORY_KEYWORDS if keyword in relative_lower), 'general')
         
         documents.append({
             'text': content,
             'metadata': {
-                'source_file': str(relative_path),
+                'source_file': relative_str,
                 'category': category,
                 'url': url,
                 'title': file_stem.replace('_', ' ').title()
@@ -187,18 +198,31 @@ def prepare_documents_for_indexing(docs_dir: str = None) -> tuple[List[str], Lis
         
         # Chunk longer documents
         if len(text) > chunk_size * 4:  # Rough estimate: 4 chars per token
-            chunks = chunk_text(text, chunk_size=chunk_size, overlap=overlap)
-            for i, chunk in enumerate(chunks):
+            first = len(metadata)
+            for i, chunk in enumerate(chunk_text(text, chunk_size=chunk_size, overlap=overlap)):
                 texts.append(chunk)
                 # Add chunk index to metadata
-                chunk_meta = doc_metadata.copy()
-                chunk_meta['chunk_index'] = i
-                chunk_meta['total_chunks'] = len(chunks)
-                metadata.append(chunk_meta)
+                metadata.append({**doc_metadata, 'chunk_index': i})
+            # The chunk count is only known once the generator is exhausted
+            for chunk_meta in metadata[first:]:
+                chunk_meta['total_chunks'] = len(metadata) - first
         else:
             texts.append(text)
             metadata.append(doc_metadata)
     
+    # Drop repeated chunks (e.g. boilerplate shared by several pages) so
+    # identical text is embedded and retrieved only once
+    seen = set()
+    unique_texts, unique_metadata = [], []
+    for text, chunk_meta in zip(texts, metadata):
+        digest = hashlib.blake2b(text.strip().encode('utf-8'), digest_size=16).digest()
+        if digest in seen:
+            continue
+        seen.add(digest)
+        unique_texts.append(text)
+        unique_metadata.append(chunk_meta)
+    texts, metadata = unique_texts, unique_metadata
+    
     print(f"Prepared {len(texts)} chunks for indexing")
     return texts, metadata
 
@@ -2,9 +2,10 @@
 Embedding generation for vector store.
 Optimized for CPU speed and low memory use.
 """
-from typing import List
+from typing import List, Optional
 import numpy as np
 import os
+import platform
 
 # Disable all progress bars and logs globally
 os.environ.setdefault("SENTENCE_TRANSFORMERS_HOME", "/tmp/.cache")
@@ -28,6 +29,43 @@ try:
 except ImportError:
     SENTENCE_TRANSFORMERS_AVAILABLE = False
 
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Character budget per token when clipping text before tokenizing. English
+# wordpiece averages ~4 characters per token; 8x headroom means only text past
+# max_seq_length tokens is clipped, short of pathological whitespace runs or
+# very long unknown words
+MAX_CHARS_PER_TOKEN = 32
+logger = logging.getLogger(__name__)
+
+# Loaded models shared by every EmbeddingGenerator in the process, keyed by
+# (device, backend setting, quantize setting, threads, ONNX file); values are
+# (model, backend name, model variant)
+_SHARED_MODELS = {}
+
+
+def select_onnx_file() -> str:
+    """Pick the model repo's INT8 ONNX export that matches this CPU's instruction set."""
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "onnx/model_qint8_arm64.onnx"
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = set(f.read().split())
+    except OSError:
+        flags = set()
+    if "avx512_vnni" in flags:
+        return "onnx/model_qint8_avx512_vnni.onnx"
+    if "avx512f" in flags:
+        return "onnx/model_qint8_avx512.onnx"
+    if "avx2" in flags:
+        return "onnx/model_quint8_avx2.onnx"
+    return "onnx/model.onnx"
+
+
+def onnx_model_file() -> str:
+    """ONNX export to load: EMBEDDING_ONNX_FILE if set, else select_onnx_file()."""
+    return os.environ.get("EMBEDDING_ONNX_FILE") or select_onnx_file()
+
 
 class EmbeddingGenerator:
     """Generate embeddings using sentence-transformers with CPU optimizations."""
@@ -41,36 +79,98 @@ class EmbeddingGenerator:
 
         # Force single-threaded Torch for small CPU servers
         # Prevents CPU thread oversubscription (huge win on small Railway/Heroku boxes)
-        torch.set_num_threads(int(os.environ.get("TORCH_NUM_THREADS", "1")))
+        num_threads = int(os.environ.get("TORCH_NUM_THREADS", "1"))
+        torch.set_num_threads(num_threads)
 
         # Use lightweight model (384-dim) and lazy-load on CPU
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.model = SentenceTransformer(
-            "sentence-transformers/all-MiniLM-L6-v2",
-            device=self.device
+
+        # Load the weights once per process; later instances reuse them.
+        # model_variant identifies the exact weights in use (ONNX export, or
+        # torch quantization) and is fixed at load time alongside the model
+        backend = os.environ.get("EMBEDDING_BACKEND", "onnx").lower()
+        onnx_file = onnx_model_file() if self.device == "cpu" and backend == "onnx" else None
+        key = (
+            self.device,
+            backend,
+            os.environ.get("EMBEDDING_QUANTIZE", "1"),
+            num_threads,
+            onnx_file,
         )
+        if key not in _SHARED_MODELS:
+            _SHARED_MODELS[key] = self._load_model(num_threads, onnx_file)
+        self.model, self.backend, self.model_variant = _SHARED_MODELS[key]
+
+        # encode() truncates to max_seq_length tokens, but only after the fast
+        # tokenizer has encoded the whole string; clip the raw text first so huge
+        # inputs don't pay for tokenizing text that is dropped anyway
+        self.max_text_chars = self.model.max_seq_length * MAX_CHARS_PER_TOKEN
+
+        # Texts per forward pass in embed_batch (index builds and batched searches)
+        default_batch_size = "64" if self.device == "cuda" else "16"
+        self.batch_size = int(os.environ.get("EMBEDDING_BATCH_SIZE", default_batch_size))
+
+    def _load_model(self, num_threads: int, onnx_file: Optional[str]):
+        """Load the model, returning (model, backend name, model variant)."""
+        # ONNX Runtime backend (CPU only) with a pre-quantized INT8 model
+        if onnx_file is not None:
+            try:
+                return self._load_onnx_model(num_threads, onnx_file), "onnx", f"onnx:{onnx_file}"
+            except Exception as e:
+                logger.warning(f"ONNX embedding backend unavailable ({e}); falling back to torch")
+
+        model = SentenceTransformer(MODEL_NAME, device=self.device)
         # Disable automatic model evaluation warnings
-        self.model.eval()
+        model.eval()
+
+        # Dynamic INT8 quantization of Linear layers (CPU only)
+        # Weights shrink ~4x and encode is bandwidth-bound on small boxes
+        quantized = self.device == "cpu" and os.environ.get("EMBEDDING_QUANTIZE", "1") == "1"
+        if quantized:
+            model = torch.ao.quantization.quantize_dynamic(
+                model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+        return model, "torch", f"torch:{self.device}:{'qint8' if quantized else 'float32'}"
+
+    @staticmethod
+    def _load_onnx_model(num_threads: int, onnx_file: str) -> "SentenceTransformer":
+        """Load the model on ONNX Runtime using the hub's INT8-quantized export."""
+        import onnxruntime as ort
+
+        session_options = ort.SessionOptions()
+        session_options.intra_op_num_threads = num_threads
+        return SentenceTransformer(
+            MODEL_NAME,
+            device="cpu",
+            backend="onnx",
+            model_kwargs={
+                "file_name": onnx_file,
+                "provider": "CPUExecutionProvider",
+                "session_options": session_options,
+            },
+        )
 
     def embed(self, text: str) -> np.ndarray:
-        """Generate embedding for one text (CPU-optimized, silent)."""
+        """Generate a unit-length embedding for one text (CPU-optimized, silent)."""
         return self.model.encode(
-            [text],
+            [text[:self.max_text_chars]],
             convert_to_numpy=True,
-            normalize_embeddings=False,
+            normalize_embeddings=True,
             show_progress_bar=False,
             batch_size=1
         )[0]
 
     def embed_batch(self, texts: List[str]) -> np.ndarray:
-        """Generate embeddings for many texts (fast on CPU)."""
-        return self.model.encode(
-            texts,
-            convert_to_numpy=True,
-            normalize_embeddings=False,
-            show_progress_bar=False,
-            batch_size=64 if self.device == "cuda" else 16
-        )
+        """Generate unit-length embeddings for many texts (fast on CPU)."""
+        # inference_mode skips autograd version tracking entirely (cheaper than no_grad)
+        with torch.inference_mode():
+            return self.model.encode(
+                [text[:self.max_text_chars] for text in texts],
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False,
+                batch_size=self.batch_size
+            )
 
     @property
     def dimension(self) -> int:
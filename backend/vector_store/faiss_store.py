@@ -3,27 +3,87 @@ FAISS-based vector store for semantic search.
 """
 import numpy as np
 import faiss
+import orjson
 import pickle
+import math
 import os
 from typing import List, Tuple, Optional
 
 from .embeddings import EmbeddingGenerator
 
+# index_factory="auto" tiers: (max corpus size, factory string)
+AUTO_INDEX_TIERS = (
+    (10_000, ""),                            # exact search is already fast
+    (1_000_000, "IVF{nlist},Flat"),          # inverted lists, full vectors
+    (None, "OPQ32_128,IVF4096,PQ32"),        # compressed codes for very large corpora
+)
+
+# Documents embedded and added per slab in add_documents (bounds peak memory)
+ADD_BATCH_SIZE = 1024
+
+# IVF indexes probe at least nlist // IVF_PROBE_DIVISOR lists per query, so the
+# share of the corpus scanned (and recall) holds up as nlist grows with it
+IVF_PROBE_DIVISOR = 8
+
+# HNSW graph build-time candidate list size (higher = better graph, slower build)
+HNSW_EF_CONSTRUCTION = 80
+
+# Leading PROTO opcode of pickle protocol 2+ (legacy .data files)
+PICKLE_HEADER = b"\x80"
+
+# read_index flag sets tried in order when loading with mmap=True
+MMAP_IO_FLAGS = (
+    faiss.IO_FLAG_MMAP | getattr(faiss, "IO_FLAG_MMAP_IFC", 0) | faiss.IO_FLAG_READ_ONLY,
+    faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY,
+)
+
 
 class FAISSVectorStore:
     """FAISS-based vector store with cosine similarity search."""
     
-    def __init__(self, embedding_generator: EmbeddingGenerator, index_path: Optional[str] = None):
+    def __init__(
+        self,
+        embedding_generator: EmbeddingGenerator,
+        index_path: Optional[str] = None,
+        index_factory: Optional[str] = None,
+        nprobe: int = 16,
+        ef_search: int = 64,
+        binary_quantize: bool = False,
+        rerank_factor: int = 4,
+        mmap: bool = False
+    ):
         """
         Initialize vector store.
         
         Args:
-            embedding_generator: EmbeddingGenerator instance
+            embedding_generator: EmbeddingGenerator instance (must return unit-length embeddings)
             index_path: Path to save/load FAISS index (optional)
+            index_factory: FAISS index_factory string used by build_index, e.g.
+                "OPQ32_64,IVF{nlist},PQ32" ({nlist} is filled in from the corpus
+                size). "auto" picks one from AUTO_INDEX_TIERS by corpus size.
+                Empty/None builds an exact flat index.
+            nprobe: Minimum number of IVF lists probed per query (IVF indexes
+                only); raised to nlist // IVF_PROBE_DIVISOR for larger indexes
+            ef_search: Candidate list size per query (HNSW indexes, e.g. "HNSW32")
+            binary_quantize: Also keep a sign-bit binary index and use it for
+                candidate retrieval (Hamming distance), reranking candidates
+                with the full-precision vectors
+            rerank_factor: Candidates fetched from the binary index per result
+            mmap: Memory-map the index file read-only on load, so multiple
+                worker processes share one page-cache copy
         """
         self.embedding_generator = embedding_generator
         self.index_path = index_path
+        self.index_factory = index_factory
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.binary_quantize = binary_quantize
+        self.rerank_factor = rerank_factor
+        self.mmap = mmap
+        self.binary_index = None
         self.index = None
+        self.mapped_path = None  # File self.index is read-only memory-mapped from, if any
+        self.stale_model_variant = False  # Loaded index was embedded by another model variant
         self.documents = []  # Store original text chunks
         self.metadata = []   # Store metadata (source, url, etc.)
         self.dimension = embedding_generator.dimension
@@ -32,27 +92,167 @@ class FAISSVectorStore:
         if index_path and os.path.exists(index_path):
             self.load(index_path)
     
-    def build_index(self, documents: List[str], metadata: Optional[List[dict]] = None):
+    @staticmethod
+    def select_index_factory(num_vectors: int) -> str:
+        """Return the AUTO_INDEX_TIERS factory string for a corpus size."""
+        for max_vectors, factory in AUTO_INDEX_TIERS:
+            if max_vectors is None or num_vectors < max_vectors:
+                return factory
+        return ""
+    
+    def _create_index(self, embeddings: np.ndarray, index_factory: Optional[str]) -> faiss.Index:
+        """Create (and train, if needed) an empty index for the given embeddings.
+        
+        Falls back to an exact flat index when no factory is set or the corpus
+        is too small to train the requested quantizer.
+        """
+        if index_factory == "auto":
+            index_factory = self.select_index_factory(len(embeddings))
+        if not index_factory:
+            return faiss.IndexFlatIP(self.dimension)
+        
+        nlist = max(1, int(4 * math.sqrt(len(embeddings))))
+        factory = index_factory.format(nlist=nlist)
+        try:
+            index = faiss.index_factory(self.dimension, factory, faiss.METRIC_INNER_PRODUCT)
+            if not index.is_trained:
+                # Corpus is small, so train on all vectors in one shot
+                index.train(embeddings)
+            hnsw = self._extract_hnsw(index)
+            if hnsw is not None:
+                hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        except RuntimeError as e:
+            print(f"Could not build '{factory}' index ({e}); falling back to flat index")
+            return faiss.IndexFlatIP(self.dimension)
+        
+        print(f"Using '{factory}' index")
+        return index
+    
+    @staticmethod
+    def _extract_hnsw(index: faiss.Index):
+        """Return the HNSW graph of an HNSW index (possibly behind a pre-transform), else None."""
+        index = faiss.downcast_index(index)
+        if isinstance(index, faiss.IndexPreTransform):
+            index = faiss.downcast_index(index.index)
+        return getattr(index, 'hnsw', None)
+    
+    def _apply_search_params(self):
+        """Apply query-time parameters (nprobe, efSearch) to IVF and HNSW indexes."""
+        ivf = faiss.try_extract_index_ivf(self.index)
+        if ivf is not None:
+            ivf.nprobe = min(ivf.nlist, max(self.nprobe, ivf.nlist // IVF_PROBE_DIVISOR))
+            if self.binary_quantize:
+                # Reranking reconstructs candidate vectors by id
+                ivf.make_direct_map()
+        hnsw = self._extract_hnsw(self.index)
+        if hnsw is not None:
+            hnsw.efSearch = self.ef_search
+    
+    @staticmethod
+    def _binarize(embeddings: np.ndarray) -> np.ndarray:
+        """Sign-bit quantize embeddings into packed uint8 codes."""
+        return np.packbits(embeddings > 0, axis=1)
+    
+    def _range_search(self, query_embeddings: np.ndarray, top_k: int, threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Let FAISS drop hits below the threshold, then keep the top_k per query.
+        
+        Falls back to a plain top-k search for index types without range search.
+        """
+        # Inner-product range search keeps only scores strictly above the radius;
+        # step one float32 ulp down so hits exactly at the threshold are kept (>=)
+        radius = float(np.nextafter(np.float32(threshold), np.float32(-np.inf)))
+        try:
+            lims, distances, labels = self.index.range_search(query_embeddings, radius)
+        except RuntimeError:
+            return self.index.search(query_embeddings, min(top_k, self.index.ntotal))
+        
+        # Padded like faiss results: missing hits have id -1
+        scores = np.full((len(query_embeddings), top_k), -np.inf, dtype='float32')
+        ids = np.full((len(query_embeddings), top_k), -1, dtype='int64')
+        for row in range(len(query_embeddings)):
+            row_scores = distances[lims[row]:lims[row + 1]]
+            row_ids = labels[lims[row]:lims[row + 1]]
+            if len(row_scores) > top_k:
+                keep = np.argpartition(-row_scores, top_k - 1)[:top_k]
+                row_scores, row_ids = row_scores[keep], row_ids[keep]
+            order = np.argsort(-row_scores)
+            scores[row, :len(order)] = row_scores[order]
+            ids[row, :len(order)] = row_ids[order]
+        return scores, ids
+    
+    def _search_binary(self, query_embeddings: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Retrieve candidates by Hamming distance, then rerank by inner product."""
+        k = min(top_k * self.rerank_factor, self.binary_index.ntotal)
+        _, candidates = self.binary_index.search(self._binarize(query_embeddings), k)
+        
+        # Padded like faiss results: missing hits have id -1
+        scores = np.full((len(query_embeddings), top_k), -np.inf, dtype='float32')
+        ids = np.full((len(query_embeddings), top_k), -1, dtype='int64')
+        for row, (row_candidates, query_embedding) in enumerate(zip(candidates, query_embeddings)):
+            row_candidates = row_candidates[row_candidates >= 0]
+            row_scores = self.index.reconstruct_batch(row_candidates) @ query_embedding
+            order = np.argsort(-row_scores)[:top_k]
+            scores[row, :len(order)] = row_scores[order]
+            ids[row, :len(order)] = row_candidates[order]
+        return scores, ids
+    
+    def build_index(
+        self,
+        documents: List[str],
+        metadata: Optional[List[dict]] = None,
+        index_factory: Optional[str] = None
+    ):
         """
         Build FAISS index from documents.
         
         Args:
             documents: List of text chunks to index
             metadata: Optional list of metadata dicts for each document
+            index_factory: Override for the store's index_factory string
         """
         print(f"Building FAISS index for {len(documents)} documents...")
+        self.build_index_from_vectors(self.embed_documents(documents), documents, metadata, index_factory)
+    
+    def embed_documents(self, documents: List[str]) -> np.ndarray:
+        """Embed documents as a contiguous [n, dimension] float32 array of unit vectors."""
+        # sentence-transformers already returns contiguous float32, so this only
+        # copies when the generator returned something else; vectors are
+        # normalized inside encode
+        return np.ascontiguousarray(self.embedding_generator.embed_batch(documents), dtype=np.float32)
+    
+    def build_index_from_vectors(
+        self,
+        embeddings: np.ndarray,
+        documents: List[str],
+        metadata: Optional[List[dict]] = None,
+        index_factory: Optional[str] = None
+    ):
+        """
+        Build FAISS index from precomputed document embeddings.
         
-        # Generate embeddings
-        embeddings = self.embedding_generator.embed_batch(documents)
+        Lets a rebuild (e.g. after changing index_factory) reuse embeddings
+        from embed_documents instead of running the model again.
         
-        # Normalize embeddings for cosine similarity (L2 normalization)
-        faiss.normalize_L2(embeddings)
+        Args:
+            embeddings: [len(documents), dimension] float32 unit vectors
+            documents: List of text chunks the embeddings belong to
+            metadata: Optional list of metadata dicts for each document
+            index_factory: Override for the store's index_factory string
+        """
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
         
         # Create FAISS index (Inner Product = cosine similarity for normalized vectors)
-        self.index = faiss.IndexFlatIP(self.dimension)
+        self.index = self._create_index(embeddings, index_factory or self.index_factory)
+        self.mapped_path = None
+        self.stale_model_variant = False
+        self._apply_search_params()
         
         # Add embeddings to index
-        self.index.add(embeddings.astype('float32'))
+        self.index.add(embeddings)
+        
+        if self.binary_quantize:
+            self.binary_index = faiss.IndexBinaryFlat(self.dimension)
+            self.binary_index.add(self._binarize(embeddings))
         
         # Store documents and metadata
         self.documents = documents
@@ -79,7 +279,8 @@ class FAISSVectorStore:
         Args:
             query: Query text
             top_k: Number of results to return
-            threshold: Minimum similarity threshold (0.0 to 1.0)
+            threshold: Minimum cosine similarity (0.0 to 1.0). Stored vectors are
+                unit-normalized, so the inner product returned by FAISS is the cosine.
         
         Returns:
             List of (document_text, similarity_score, metadata) tuples
@@ -87,65 +288,156 @@ class FAISSVectorStore:
         if self.index is None or self.index.ntotal == 0:
             return []
         
-        # Generate query embedding
-        query_embedding = self.embedding_generator.embed(query)
+        return self._search_embeddings(self.encode_query(query), top_k, threshold)[0]
+    
+    def encode_query(self, query: str) -> np.ndarray:
+        """Embed one query as a [1, dimension] float32 array for search_embedding."""
+        # embed_batch already returns the 2D (1 query, dimension features) float32
+        # array FAISS wants, so no reshape or copy is needed
+        return np.ascontiguousarray(self.embedding_generator.embed_batch([query]), dtype=np.float32)
+    
+    def search_embedding(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int = 3,
+        threshold: float = 0.0
+    ) -> List[Tuple[str, float, dict]]:
+        """
+        Search with a query already embedded by encode_query.
+        
+        Lets callers run several searches (e.g. different thresholds) for one
+        query without embedding it again. Arguments and results as in search.
+        """
+        if self.index is None or self.index.ntotal == 0:
+            return []
+        
+        return self._search_embeddings(query_embedding, top_k, threshold)[0]
+    
+    def search_batch(
+        self,
+        queries: List[str],
+        top_k: int = 3,
+        threshold: float = 0.0
+    ) -> List[List[Tuple[str, float, dict]]]:
+        """
+        Search for many queries with one embedding pass and one FAISS search.
         
-        # Normalize for cosine similarity
-        # Reshape to 2D array (1 query, dimension features) for FAISS
-        query_embedding = query_embedding.astype('float32').reshape(1, -1)
-        faiss.normalize_L2(query_embedding)
+        Args:
+            queries: Query texts
+            top_k: Number of results to return per query
+            threshold: Minimum cosine similarity (see search)
         
-        # Search (query_embedding is now 2D: [1, dimension])
-        similarities, indices = self.index.search(query_embedding, min(top_k, self.index.ntotal))
+        Returns:
+            One list of (document_text, similarity_score, metadata) tuples per query
+        """
+        if self.index is None or self.index.ntotal == 0 or not queries:
+            return [[] for _ in queries]
+        
+        query_embeddings = np.ascontiguousarray(self.embedding_generator.embed_batch(queries), dtype=np.float32)
+        return self._search_embeddings(query_embeddings, top_k, threshold)
+    
+    def _search_embeddings(
+        self,
+        query_embeddings: np.ndarray,
+        top_k: int,
+        threshold: float
+    ) -> List[List[Tuple[str, float, dict]]]:
+        """Search a 2D [n_queries, dimension] array of unit-length query embeddings."""
+        if self.binary_index is not None:
+            similarities, indices = self._search_binary(query_embeddings, top_k)
+        elif threshold > 0:
+            similarities, indices = self._range_search(query_embeddings, top_k, threshold)
+        else:
+            similarities, indices = self.index.search(query_embeddings, min(top_k, self.index.ntotal))
+        
+        return [
+            self._format_results(similarity_array, indices_array, threshold)
+            for similarity_array, indices_array in zip(similarities, indices)
+        ]
+    
+    def _format_results(
+        self,
+        similarity_array: np.ndarray,
+        indices_array: np.ndarray,
+        threshold: float
+    ) -> List[Tuple[str, float, dict]]:
+        """Filter one query's hits by threshold and attach text/metadata."""
+        # Filter in NumPy (missing hits are -1; ids past the stored documents are skipped),
+        # so Python only touches the survivors
+        mask = (indices_array >= 0) & (indices_array < len(self.documents)) & (similarity_array >= threshold)
         
-        # Filter by threshold and format results
         results = []
-        similarity_array = similarities[0] if len(similarities.shape) > 1 else similarities
-        indices_array = indices[0] if len(indices.shape) > 1 else indices
-        
-        for similarity, idx in zip(similarity_array, indices_array):
-            if idx >= 0 and similarity >= threshold:
-                # Ensure idx is within bounds
-                if idx >= len(self.documents):
-                    continue
-                
-                # Get metadata safely
-                if idx < len(self.metadata):
-                    metadata = self.metadata[idx]
-                else:
-                    metadata = {}
-                
-                # Ensure metadata is a dict
-                if not isinstance(metadata, dict):
-                    metadata = {}
-                
-                results.append((
-                    self.documents[idx],
-                    float(similarity),
-                    metadata
-                ))
+        for similarity, idx in zip(similarity_array[mask].tolist(), indices_array[mask].tolist()):
+            # Get metadata safely
+            metadata = self.metadata[idx] if idx < len(self.metadata) else {}
+            
+            # Ensure metadata is a dict
+            if not isinstance(metadata, dict):
+                metadata = {}
+            
+            results.append((self.documents[idx], similarity, metadata))
         
         return results
     
+    @staticmethod
+    def _fsync_file(path: str):
+        """Flush a written file's contents to disk."""
+        with open(path, 'rb') as f:
+            os.fsync(f.fileno())
+    
     def save(self, path: str):
-        """Save index and documents to disk."""
+        """Save index and documents to disk.
+        
+        Files are written to *.tmp, fsynced, then renamed into place so a crash
+        mid-save never leaves a truncated index (processes that already
+        memory-mapped the old file keep reading it safely).
+        """
         print(f"Saving index to {path}...")
         os.makedirs(os.path.dirname(path) if os.path.dirname(path) else '.', exist_ok=True)
         
-        # Save FAISS index
-        faiss.write_index(self.index, path)
-        
-        # Save documents and metadata
         data_path = path.replace('.index', '.data')
-        with open(data_path, 'wb') as f:
-            pickle.dump({
+        binary_path = path.replace('.index', '.bindex')
+        
+        # Save documents and metadata (orjson: faster than pickle and not executable)
+        with open(data_path + '.tmp', 'wb') as f:
+            f.write(orjson.dumps({
                 'documents': self.documents,
                 'metadata': self.metadata,
-                'dimension': self.dimension
-            }, f)
+                'dimension': self.dimension,
+                'model_variant': getattr(self.embedding_generator, 'model_variant', None)
+            }))
+            f.flush()
+            os.fsync(f.fileno())
+        
+        # Save FAISS index
+        faiss.write_index(self.index, path + '.tmp')
+        self._fsync_file(path + '.tmp')
+        if self.binary_index is not None:
+            faiss.write_index_binary(self.binary_index, binary_path + '.tmp')
+            self._fsync_file(binary_path + '.tmp')
+        
+        # Index file goes last: its presence marks a complete save
+        os.replace(data_path + '.tmp', data_path)
+        if self.binary_index is not None:
+            os.replace(binary_path + '.tmp', binary_path)
+        os.replace(path + '.tmp', path)
         
         print("Index saved successfully")
     
+    @staticmethod
+    def _prefetch(path: str):
+        """Ask the kernel to read a memory-mapped file into the page cache ahead of the first query."""
+        if not hasattr(os, "posix_fadvise"):
+            return
+        try:
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+            finally:
+                os.close(fd)
+        except OSError:
+            pass
+    
     def load(self, path: str):
         """Load index and documents from disk."""
         print(f"Loading index from {path}...")
@@ -154,8 +446,36 @@ class FAISSVectorStore:
             print(f"Index file not found: {path}")
             return
         
-        # Load FAISS index
-        self.index = faiss.read_index(path)
+        # Load FAISS index (PQ/OPQ codebooks are stored in the same file)
+        self.index = None
+        self.mapped_path = None
+        self.stale_model_variant = False
+        if self.mmap:
+            # IO_FLAG_MMAP_IFC maps flat/SQ/HNSW codes; IVF inverted lists reject
+            # it combined with IO_FLAG_MMAP and are mapped by IO_FLAG_MMAP alone
+            for io_flags in MMAP_IO_FLAGS:
+                try:
+                    self.index = faiss.read_index(path, io_flags)
+                    break
+                except RuntimeError as e:
+                    error = e
+            if self.index is not None:
+                self.mapped_path = path
+                self._prefetch(path)
+            else:
+                print(f"Could not memory-map index ({error}); loading into memory")
+        if self.index is None:
+            self.index = faiss.read_index(path)
+        self._apply_search_params()
+        
+        if self.binary_quantize:
+            binary_path = path.replace('.index', '.bindex')
+            if os.path.exists(binary_path):
+                self.binary_index = faiss.read_index_binary(binary_path)
+            else:
+                # Index was built without binary codes - derive them from stored vectors
+                self.binary_index = faiss.IndexBinaryFlat(self.index.d)
+                self.binary_index.add(self._binarize(self.index.reconstruct_n(0, self.index.ntotal)))
         
         # Get actual dimension from loaded index
         index_dimension = self.index.d if hasattr(self.index, 'd') else self.dimension
@@ -164,7 +484,15 @@ class FAISSVectorStore:
         data_path = path.replace('.index', '.data')
         if os.path.exists(data_path):
             with open(data_path, 'rb') as f:
-                data = pickle.load(f)
+                raw = f.read()
+                try:
+                    data = orjson.loads(raw)
+                except orjson.JSONDecodeError:
+                    # Only a file with a pickle protocol header (written by an
+                    # older version) is unpickled; anything else is corrupt
+                    if not raw.startswith(PICKLE_HEADER):
+                        raise
+                    data = pickle.loads(raw)
                 self.documents = data.get('documents', [])
                 self.metadata = data.get('metadata', [])
                 # Use dimension from data file, or from index, or fallback to embedding generator
@@ -176,6 +504,15 @@ class FAISSVectorStore:
                     print(f"WARNING: Index dimension ({self.dimension}) doesn't match embedding generator dimension ({self.embedding_generator.dimension})")
                     print(f"This may cause search failures. Rebuild index with matching embedding model.")
                 
+                # Vectors from another model variant (e.g. a different ONNX export
+                # or torch FP32) don't line up with this generator's query vectors
+                stored_variant = data.get('model_variant')
+                current_variant = getattr(self.embedding_generator, 'model_variant', None)
+                if current_variant is not None and stored_variant != current_variant:
+                    self.stale_model_variant = True
+                    print(f"WARNING: Index was embedded with model variant {stored_variant or '(unrecorded)'}, but queries use {current_variant}")
+                    print(f"Search quality will suffer until the index is rebuilt.")
+                
                 # Ensure metadata matches documents length
                 if len(self.metadata) < len(self.documents):
                     self.metadata.extend([{}] * (len(self.documents) - len(self.metadata)))
@@ -191,17 +528,26 @@ class FAISSVectorStore:
         print(f"Index loaded with {self.index.ntotal} vectors (dimension: {self.dimension})")
     
     def add_documents(self, documents: List[str], metadata: Optional[List[dict]] = None):
-        """Add new documents to existing index."""
+        """Add new documents to existing index.
+        
+        A memory-mapped index is read-only (FAISS aborts the process on writes),
+        so it is first re-read into memory.
+        """
         if self.index is None:
             self.build_index(documents, metadata)
             return
         
-        # Generate embeddings for new documents
-        embeddings = self.embedding_generator.embed_batch(documents)
-        faiss.normalize_L2(embeddings)
+        if self.mapped_path is not None:
+            self.index = faiss.read_index(self.mapped_path)
+            self.mapped_path = None
+            self._apply_search_params()
         
-        # Add to index
-        self.index.add(embeddings.astype('float32'))
+        # Embed and add in slabs so only ADD_BATCH_SIZE embeddings are resident at once
+        for start in range(0, len(documents), ADD_BATCH_SIZE):
+            embeddings = self.embed_documents(documents[start:start + ADD_BATCH_SIZE])
+            self.index.add(embeddings)
+            if self.binary_index is not None:
+                self.binary_index.add(self._binarize(embeddings))
         
         # Update documents and metadata
         self.documents.extend(documents)
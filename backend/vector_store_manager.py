@@ -1,16 +1,24 @@
 """
 Vector store initialization and management.
 """
+import fcntl
+import glob
+import hashlib
 import os
 import logging
-from typing import Optional
+from contextlib import contextmanager
+from typing import List, Optional
+
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
 # Try to import vector store dependencies
 try:
     from vector_store.faiss_store import FAISSVectorStore
+    from vector_store.batcher import SearchBatcher
     from vector_store.document_loader import prepare_documents_for_indexing
+    from vector_store.embeddings import MODEL_NAME
     from vector_store.index_utils import check_index_exists, ensure_index_directory
     VECTOR_STORE_AVAILABLE = True
 except ImportError as e:
@@ -18,7 +26,9 @@ except ImportError as e:
     print(f"INFO: Vector store dependencies not available: {e}", file=sys.stdout)
     VECTOR_STORE_AVAILABLE = False
     FAISSVectorStore = None
+    SearchBatcher = None
     prepare_documents_for_indexing = None
+    MODEL_NAME = None
     check_index_exists = None
     ensure_index_directory = None
 
@@ -62,17 +72,28 @@ def initialize_vector_store():
         return None
     
     try:
-        vector_store = FAISSVectorStore(embedding_gen, index_path=index_path)
+        vector_store = FAISSVectorStore(
+            embedding_gen,
+            index_path=index_path,
+            index_factory=config.VECTOR_INDEX_FACTORY,
+            nprobe=config.VECTOR_SEARCH_NPROBE,
+            ef_search=config.VECTOR_SEARCH_EF,
+            binary_quantize=config.VECTOR_BINARY_QUANTIZE,
+            rerank_factor=config.VECTOR_RERANK_FACTOR,
+            mmap=config.VECTOR_INDEX_MMAP
+        )
         index_loaded = vector_store.index is not None and vector_store.index.ntotal > 0 if vector_store.index else False
         
-        # Pre-warm embedding model with a dummy query to avoid first-query delay
+        # Pre-warm embedding model and FAISS search to avoid first-query delay
+        # Use a realistic-length payload so the warm kernels match real queries
         if index_loaded:
             if logger.isEnabledFor(logging.DEBUG):
-                logger.debug("Pre-warming embedding model...")
+                logger.debug("Pre-warming embedding model and index...")
             try:
-                embedding_gen.embed("warmup")
+                embedding_gen.embed(" ".join(["nextflow"] * 64))
+                vector_store.search("nextflow pipeline parameters", top_k=config.VECTOR_SEARCH_TOP_K)
                 if logger.isEnabledFor(logging.DEBUG):
-                    logger.debug("Embedding model warmed up")
+                    logger.debug("Embedding model and index warmed up")
             except Exception as e:
                 logger.warning(f"Failed to warm up model: {e}")
         
@@ -83,27 +104,87 @@ def initialize_vector_store():
         return None
 
 
+@contextmanager
+def _build_lock(index_path: str):
+    """Exclusive file lock so only one worker process builds the index."""
+    with open(f"{index_path}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _embedding_cache_path(index_path: str, vector_store: FAISSVectorStore, texts: List[str]) -> str:
+    """Cache file for the embeddings of exactly these chunks under the current model variant.
+    
+    The variant covers the backend and the ONNX export or torch quantization,
+    so switching any of them never reuses another variant's vectors.
+    """
+    digest = hashlib.sha256()
+    variant = getattr(vector_store.embedding_generator, "model_variant", "")
+    digest.update(f"{MODEL_NAME}\0{variant}\0".encode())
+    for text in texts:
+        digest.update(text.encode())
+        digest.update(b"\0")
+    index_dir = os.path.dirname(os.path.abspath(index_path))
+    return os.path.join(index_dir, f"embeddings_{digest.hexdigest()[:16]}.npy")
+
+
+def _embed_with_cache(vector_store: FAISSVectorStore, texts: List[str], cache_path: str) -> np.ndarray:
+    """Embed texts, reusing the cache file from an earlier build of the same chunks.
+    
+    Rebuilding after an index_factory change or a crashed build then skips the
+    embedding pass, which dominates build time.
+    """
+    if os.path.exists(cache_path):
+        try:
+            embeddings = np.load(cache_path)
+            if embeddings.shape == (len(texts), vector_store.dimension):
+                logger.info(f"Reusing cached embeddings from {cache_path}")
+                return embeddings
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable embedding cache {cache_path}: {e}")
+    
+    embeddings = vector_store.embed_documents(texts)
+    try:
+        # Write then rename so a crash never leaves a truncated cache file
+        with open(cache_path + ".tmp", "wb") as f:
+            np.save(f, embeddings)
+        os.replace(cache_path + ".tmp", cache_path)
+        # Caches for older versions of the docs are never read again
+        for stale in glob.glob(os.path.join(os.path.dirname(cache_path), "embeddings_*.npy")):
+            if stale != cache_path:
+                os.remove(stale)
+    except OSError as e:
+        logger.warning(f"Could not write embedding cache {cache_path}: {e}")
+    return embeddings
+
+
 def load_or_build_index(vector_store: Optional[FAISSVectorStore]):
-    """Build index if it doesn't exist.
+    """Build index if it doesn't exist, or rebuild it if it was embedded by another model variant.
     
     Always attempts to build if index is missing, regardless of docs availability.
+    A stale index keeps serving when the docs needed to rebuild it are missing.
     """
     if not vector_store or not VECTOR_STORE_AVAILABLE:
         return
     
     # Check if index is already loaded (was found and loaded by FAISSVectorStore.__init__)
-    if vector_store.index is not None and vector_store.index.ntotal > 0:
+    index_loaded = vector_store.index is not None and vector_store.index.ntotal > 0
+    if index_loaded and not vector_store.stale_model_variant:
         logger.info(f"Vector store ready: {vector_store.index.ntotal} vectors loaded")
         return
     
-    # Index doesn't exist - always attempt to build it
     index_exists, index_path, _ = check_index_exists()
-    if index_exists:
+    if index_loaded:
+        logger.warning("Index was embedded with a different model variant - attempting to rebuild from documentation...")
+    elif index_exists:
         # Index exists but wasn't loaded - this shouldn't happen, but handle gracefully
         logger.warning(f"Index files exist at {index_path} but failed to load")
         return
-    
-    logger.info("Index not found - attempting to build from documentation...")
+    else:
+        logger.info("Index not found - attempting to build from documentation...")
     
     # Ensure data directory exists
     ensure_index_directory(index_path)
@@ -116,6 +197,9 @@ def load_or_build_index(vector_store: Optional[FAISSVectorStore]):
         # Default location where Dockerfile clones docs (only if index doesn't exist)
         if os.path.exists("/app/nextflow-docs"):
             docs_dir = "/app/nextflow-docs"
+        elif index_loaded:
+            logger.warning("NEXTFLOW_DOCS_DIR not set - keeping the existing index")
+            return
         else:
             # If index doesn't exist and docs don't exist, we can't build
             logger.error("Index not found and NEXTFLOW_DOCS_DIR not set")
@@ -123,6 +207,9 @@ def load_or_build_index(vector_store: Optional[FAISSVectorStore]):
             return
     
     # Check if docs directory exists
+    if not os.path.exists(docs_dir) and index_loaded:
+        logger.warning(f"Docs directory not found: {docs_dir} - keeping the existing index")
+        return
     if not os.path.exists(docs_dir):
         # Docs directory was set but doesn't exist - this shouldn't happen, but handle gracefully
         logger.error(f"Docs directory not found: {docs_dir}")
@@ -130,16 +217,28 @@ def load_or_build_index(vector_store: Optional[FAISSVectorStore]):
         return
     
     # Build index from documentation
-    logger.info(f"Loading documents from: {docs_dir}")
-    try:
-        texts, metadata = prepare_documents_for_indexing(docs_dir=docs_dir)
-        if texts and len(texts) > 0:
-            logger.info(f"Building index from {len(texts)} document chunks...")
-            vector_store.build_index(texts, metadata)
-            logger.info(f"Vector store built successfully: {len(texts)} chunks indexed")
-        else:
-            logger.warning("No documents loaded from docs directory")
-            logger.error("Unable to build vector index - no documents found")
-    except Exception as e:
-        logger.error(f"Failed to build index: {e}", exc_info=True)
-
+    # Serialize across uvicorn workers; whoever gets the lock second loads the result
+    with _build_lock(index_path):
+        index_exists, _, _ = check_index_exists()
+        if index_exists:
+            # Either another worker built it while we waited, or it is the stale
+            # index; reloading tells which
+            vector_store.load(index_path)
+            if not vector_store.stale_model_variant:
+                logger.info("Index was built by another worker - loaded it")
+                return
+        
+        logger.info(f"Loading documents from: {docs_dir}")
+        try:
+            texts, metadata = prepare_documents_for_indexing(docs_dir=docs_dir)
+            if texts and len(texts) > 0:
+                logger.info(f"Building index from {len(texts)} document chunks...")
+                cache_path = _embedding_cache_path(index_path, vector_store, texts)
+                embeddings = _embed_with_cache(vector_store, texts, cache_path)
+                vector_store.build_index_from_vectors(embeddings, texts, metadata)
+                logger.info(f"Vector store built successfully: {len(texts)} chunks indexed")
+            else:
+                logger.warning("No documents loaded from docs directory")
+                logger.error("Unable to build vector index - no documents found")
+        except Exception as e:
+            logger.error(f"Failed to build index: {e}", exc_info=True)